@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy import func, literal, select
+from database import SessionLocal
+from models.article import Article
+from models.news_enrty import NewsEntry
+
+# Articles read per query while a subscriber catches up
+STREAM_BATCH = 500
+# Keep-alive interval; also bounds the delay for articles stored by another process
+HEARTBEAT_SECONDS = 15
+STREAM_FIELDS = ("id", "news_entry_id", "title", "link", "guid", "published_date", "published_at",
+                 "creator", "category", "description", "media", "fetched_at", "story_id")
+
+
+class ArticleEvents:
+    """
+    Wakes the stream subscribers when articles are stored. Only the wake-up
+    goes through here, subscribers read the articles from the database after
+    their last event id, so a reconnecting client resumes without gaps.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers[event] = asyncio.get_running_loop()
+        return event
+
+    def unsubscribe(self, event: asyncio.Event):
+        with self._lock:
+            self._subscribers.pop(event, None)
+
+    def publish(self):
+        # Called from the threads storing articles
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for event, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed
+                self.unsubscribe(event)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+def list_contains(column, value: str):
+    # Categories and tags are stored comma separated
+    value = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return (literal(",") + func.coalesce(column, "") + literal(",")).like(f"%,{value},%", escape="\\")
+
+
+def latest_article_id(db) -> int:
+    return db.scalar(select(func.max(Article.id))) or 0
+
+
+def articles_after(db, last_id: int, feed_id: Optional[int] = None, category: Optional[str] = None,
+                   tag: Optional[str] = None, content: bool = False, up_to: Optional[int] = None,
+                   limit: int = STREAM_BATCH) -> List[Dict]:
+    query = select(Article).where(Article.id > last_id)
+    if up_to is not None:
+        query = query.where(Article.id <= up_to)
+    if feed_id is not None:
+        query = query.where(Article.news_entry_id == feed_id)
+    if category or tag:
+        query = query.join(NewsEntry, NewsEntry.id == Article.news_entry_id)
+        if category:
+            query = query.where(list_contains(NewsEntry.categories, category))
+        if tag:
+            query = query.where(list_contains(NewsEntry.tags, tag))
+    fields = STREAM_FIELDS + ("content",) if content else STREAM_FIELDS
+    return [
+        {field: getattr(article, field) for field in fields}
+        for article in db.scalars(query.order_by(Article.id).limit(limit))
+    ]
+
+
+async def article_stream(last_id: Optional[int], feed_id: Optional[int] = None, category: Optional[str] = None,
+                         tag: Optional[str] = None, content: bool = False):
+    """
+    Yields lists of new articles as they are stored, and an empty list on
+    every heartbeat. Without last_id only articles stored from now on are sent.
+    """
+    def read(after: Optional[int]):
+        # Returns the new last id and the rows after `after`. When the rows
+        # are all read the cursor moves to the latest id even if the filters
+        # matched nothing, so the next read does not scan the same rows again.
+        # Ids are assumed to be committed in order, true with the single
+        # article writer.
+        with SessionLocal() as db:
+            latest = latest_article_id(db)
+            if after is None:
+                return latest, []
+            rows = articles_after(db, after, feed_id, category, tag, content, up_to=latest)
+            if len(rows) < STREAM_BATCH:
+                return max(after, latest), rows
+            return rows[-1]["id"], rows
+
+    wakeup = article_events.subscribe()
+    try:
+        if last_id is None:
+            last_id, _ = await asyncio.to_thread(read, None)
+        while True:
+            wakeup.clear()
+            last_id, rows = await asyncio.to_thread(read, last_id)
+            if rows:
+                yield rows
+                if len(rows) == STREAM_BATCH:
+                    continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield []
+    finally:
+        article_events.unsubscribe(wakeup)
+
+
+article_events = ArticleEvents()
@@ -0,0 +1,130 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from database import SessionLocal, engine
+from models.article import Article
+from near_dup import assign_stories, signature_bytes, story_text
+
+# Rows per INSERT statement, keeps us under SQLite's bound variable limit
+INSERT_CHUNK = 500
+# Columns served by /articles
+ARTICLE_FIELDS = ("id", "uid", "news_entry_id", "title", "link", "guid", "published_date", "published_at", "creator",
+                  "category", "content", "description", "media", "fetched_at", "story_id")
+
+
+def article_uid(row: Dict[str, str]) -> str:
+    key = row.get("guid") or row.get("link") or row.get("title") or ""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def parse_published(value: str) -> Optional[datetime]:
+    # RSS uses RFC 822 dates, Atom uses ISO 8601
+    if not value:
+        return None
+    try:
+        published = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            published = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if published.tzinfo is not None:
+        published = published.astimezone(timezone.utc).replace(tzinfo=None)
+    return published
+
+
+def _insert(rows: List[Dict]):
+    # INSERT ... ON CONFLICT DO NOTHING for the dialects that support it
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return (
+        insert(Article)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["uid"])
+        .returning(Article.id, Article.uid)
+    )
+
+
+def to_record(news_id: Optional[int], row: Dict[str, str], fetched_at: datetime) -> Dict:
+    return {
+        "uid": article_uid(row),
+        "news_entry_id": news_id,
+        "title": row.get("title"),
+        "link": row.get("link"),
+        "guid": row.get("guid"),
+        "published_date": row.get("published_date"),
+        "published_at": parse_published(row.get("published_date")),
+        "creator": row.get("creator"),
+        "category": row.get("category"),
+        "content": row.get("content"),
+        "description": row.get("description"),
+        "media": row.get("media"),
+        "fetched_at": fetched_at,
+        "minhash": signature_bytes(story_text(row)),
+    }
+
+
+def prepare_records(news_id: Optional[int], rows: Iterable[Dict[str, str]]) -> List[Dict]:
+    # One record per uid, the first occurrence wins
+    fetched_at = datetime.utcnow()
+    records = {}
+    for row in rows:
+        record = to_record(news_id, row, fetched_at)
+        records.setdefault(record["uid"], record)
+    return list(records.values())
+
+
+def insert_records(db, records: List[Dict]) -> Dict[str, int]:
+    # Runs inside the caller's transaction, returns {uid: id} of the new rows
+    inserted = {}
+    for start in range(0, len(records), INSERT_CHUNK):
+        result = db.execute(_insert(records[start:start + INSERT_CHUNK]))
+        inserted.update({uid: article_id for article_id, uid in result})
+    # Near-duplicates of other feeds join the story of the first copy
+    assign_stories(db, records, inserted)
+    return inserted
+
+
+def store_articles(news_id: Optional[int], rows: Iterable[Dict[str, str]], db=None) -> Dict[str, int]:
+    """
+    Inserts the fetched rows in one transaction, skipping articles already
+    stored. Returns {uid: id} of the newly inserted articles.
+    """
+    records = prepare_records(news_id, rows)
+    if not records:
+        return {}
+
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        inserted = insert_records(db, records)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+    return inserted
+
+
+def recent_articles(db, feed_id: Optional[int] = None, since_id: int = 0,
+                    since: Optional[datetime] = None, limit: Optional[int] = None,
+                    story_id: Optional[int] = None) -> List[Dict]:
+    # Dicts, not instances: FastAPI encodes the response on the event loop while
+    # get_db closes the session on a worker thread, detaching the instances
+    query = select(Article).where(Article.id > since_id)
+    if feed_id is not None:
+        query = query.where(Article.news_entry_id == feed_id)
+    if story_id is not None:
+        query = query.where(Article.story_id == story_id)
+    if since is not None:
+        query = query.where(Article.published_at >= since)
+    query = query.order_by(Article.id)
+    if limit:
+        query = query.limit(limit)
+    return [{field: getattr(article, field) for field in ARTICLE_FIELDS} for article in db.scalars(query)]
@@ -0,0 +1,89 @@
+"""
+Throughput of the batched article writer with concurrent fetches of feeds
+that syndicate the same stories. Before timing it checks that two requests
+carrying the same articles, committed in one batch, both succeed and store
+each article (and its near-duplicate bands) once; exits with status 1 if
+not. Runs on a throwaway SQLite database. Run from the app directory:
+
+    python -m benchmarks.bench_article_writer --feeds 50 --items 50 --shared 0.3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from feed_parser import iter_feed
+from benchmarks.feeds import make_rss
+
+
+def feed_rows(feed: int, items: int, shared: float):
+    # The first shared share of the items is the same in every feed
+    common = int(items * shared)
+    rows = list(iter_feed(make_rss(common, 500, 0, seed=1, prefix="shared/")))
+    rows += list(iter_feed(make_rss(items - common, 500, 0, seed=feed + 2, prefix=f"f{feed}/")))
+    return rows
+
+
+def check_overlapping_submits() -> int:
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from db_writer import ArticleWriter
+    from models.article import Article, ArticleBand
+    rows = list(iter_feed(make_rss(20, 500, 0, seed=11, prefix="overlap/")))
+    # A long latency budget puts both requests in the same batch
+    writer = ArticleWriter(max_latency=0.5)
+    futures = [writer.submit(1, rows), writer.submit(2, rows)]
+    failures = 0
+    try:
+        results = [future.result(timeout=30) for future in futures]
+    except Exception as e:
+        print(f"overlapping submits failed: {e}")
+        return 1
+    finally:
+        writer.close()
+    uids = [uid for result in results for uid in result]
+    with SessionLocal() as db:
+        ids = [article_id for result in results for article_id in result.values()]
+        stored = db.scalar(select(func.count(Article.id)).where(Article.id.in_(ids)))
+        bands = db.execute(select(ArticleBand.key, ArticleBand.article_id).where(ArticleBand.article_id.in_(ids))).all()
+    if len(uids) != len(rows) or len(set(uids)) != len(rows):
+        print(f"overlapping submits: {len(uids)} new articles reported for {len(rows)} rows")
+        failures += 1
+    if stored != len(rows):
+        print(f"overlapping submits: {stored} articles stored for {len(rows)} rows")
+        failures += 1
+    if len(bands) != len(set(bands)):
+        print("overlapping submits: duplicate article_band rows")
+        failures += 1
+    print(f"overlapping submits: {'ok' if not failures else 'FAILED'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feeds", type=int, default=50)
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--shared", type=float, default=0.3, help="share of the items every feed carries")
+    args = parser.parse_args()
+
+    # The app modules read DATABASE_URL when imported
+    workdir = tempfile.mkdtemp(prefix="newswire-writer-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'writer.db')}"
+    failed = check_overlapping_submits()
+
+    from db_writer import ArticleWriter
+    feeds = [feed_rows(feed, args.items, args.shared) for feed in range(args.feeds)]
+    writer = ArticleWriter()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(16) as pool:
+        stored = sum(len(result) for result in pool.map(lambda item: writer.store(*item), enumerate(feeds, 100)))
+    seconds = time.perf_counter() - started
+    writer.close()
+    rows = sum(len(rows) for rows in feeds)
+    print(f"{rows} rows from {args.feeds} feeds, {stored} new articles: {rows / seconds:8.0f} rows/s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Load time of the ML inputs: vectorizing every preprocessed text with
+TfidfVectorizer on each run, against mapping the term counts of the on-disk
+corpus and weighting them, for the whole corpus and for the last 10% of the
+ids. Also times reading one Parquet column against all of them. Run from the
+app directory:
+
+    python -m benchmarks.bench_corpus --articles 50000 --segment-rows 5000
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime
+from sklearn.feature_extraction.text import TfidfVectorizer
+from corpus import Corpus, tfidf
+from models.article import Article
+from benchmarks.feeds import WORDS
+
+
+def make_articles(count: int, words: int, seed: int = 11):
+    rng = random.Random(seed)
+    vocabulary = [f"{word}{i}" for word in WORDS for i in range(300)]
+    articles, tokens = [], {}
+    for article_id in range(1, count + 1):
+        text = " ".join(rng.choice(vocabulary) for _ in range(words))
+        articles.append(Article(id=article_id, news_entry_id=article_id % 50, title=f"Story {article_id}",
+                                content=text, fetched_at=datetime(2025, 1, 1)))
+        tokens[article_id] = text
+    return articles, tokens
+
+
+def timed(label: str, function):
+    started = time.perf_counter()
+    result = function()
+    print(f"{label:34}: {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--segment-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    articles, tokens = make_articles(args.articles, args.words)
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = Corpus(directory)
+        with corpus.lock():
+            for start in range(0, len(articles), args.segment_rows):
+                batch = articles[start:start + args.segment_rows]
+                corpus.append(batch, tokens, batch[-1].id)
+
+        texts = list(tokens.values())
+        timed("TfidfVectorizer, all texts", lambda: TfidfVectorizer().fit_transform(texts))
+        timed("corpus counts + tfidf, all", lambda: tfidf(corpus.counts()[1]))
+        first_id = args.articles - args.articles // 10
+        timed("TfidfVectorizer, last 10%", lambda: TfidfVectorizer().fit_transform(texts[first_id - 1:]))
+        timed("corpus counts + tfidf, last 10%", lambda: tfidf(corpus.counts(first_id)[1]))
+        timed("Parquet, all columns", lambda: corpus.read_table())
+        timed("Parquet, title column", lambda: corpus.read_table(["title"]))
+
+
+if __name__ == "__main__":
+    main()
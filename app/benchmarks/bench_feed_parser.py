@@ -0,0 +1,65 @@
+"""
+Compares the streaming lxml parser with the BeautifulSoup(..., 'xml') path
+fetch_rss used before. Run from the app directory:
+
+    python -m benchmarks.bench_feed_parser --items 2000 --limit 10
+"""
+import argparse
+import time
+from bs4 import BeautifulSoup
+from feed_parser import parse_feed
+from benchmarks.feeds import make_rss, make_atom
+
+
+def parse_feed_soup(content: bytes, limit: int):
+    # The previous fetch_rss parsing code, without the CSV and cleaning steps
+    entries = BeautifulSoup(content, 'xml').find_all('item')[:limit]
+    rows = []
+    for entry in entries:
+        rows.append({
+            "title": entry.title.text,
+            "link": entry.link.text,
+            "published_date": entry.pubDate.text,
+            "creator": entry.find('dc:creator').text if entry.find('dc:creator') else "No creator",
+            "category": entry.category.text if entry.find('category') else "No category",
+            "content": entry.find('content:encoded').text if entry.find('content:encoded') else "",
+            "description": entry.description.text if entry.description else "",
+            "guid": entry.guid.text,
+            "media": entry.find('media:thumbnail')['url'] if entry.find('media:thumbnail') else "No thumbnail",
+        })
+    return rows
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rss = make_rss(args.items)
+    atom = make_atom(args.items)
+    print(f"rss feed: {args.items} items, {len(rss) / 1e6:.1f} MB")
+
+    # Both parsers must agree before their timings mean anything
+    assert parse_feed(rss, args.limit) == parse_feed_soup(rss, args.limit)
+
+    for limit in (args.limit, args.items):
+        soup = best_of(lambda: parse_feed_soup(rss, limit), args.repeat)
+        stream = best_of(lambda: parse_feed(rss, limit), args.repeat)
+        print(f"rss  limit={limit:<6} soup {soup * 1000:9.1f} ms   iterparse {stream * 1000:9.1f} ms   x{soup / stream:.1f}")
+    stream = best_of(lambda: parse_feed(atom, args.items), args.repeat)
+    print(f"atom limit={args.items:<6} iterparse {stream * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
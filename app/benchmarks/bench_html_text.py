@@ -0,0 +1,115 @@
+"""
+Throughput of clean_html_text: the previous BeautifulSoup tree per item
+against the regex extractor, on the descriptions and full content of a
+synthetic feed. Before timing it checks that both give the same text: the
+golden cases below, the synthetic feed and random markup fragments. Exits
+with status 1 on any difference. Run from the app directory:
+
+    python -m benchmarks.bench_html_text --items 200 --fuzz 20000
+"""
+import argparse
+import random
+import sys
+import time
+from feed_parser import iter_feed
+from html_text import html_to_text, html_to_text_many, soup_to_text
+from benchmarks.feeds import make_rss
+
+# Input and the expected output, the malformed ones included
+GOLDEN = [
+    ('plain text', 'plain text'),
+    ('<p>Hello <b>world</b>!</p>', 'Hello  world !'),
+    ('<p>a</p><p>b</p>', 'a b'),
+    ('a &amp; b &lt;tag&gt;', 'a & b <tag>'),
+    ('a &amp;lt; b', 'a < b'),
+    ('x < y and y > z', 'x < y and y > z'),
+    ('<!-- c -->text<!--x-->more', 'text more'),
+    ('<script>var a=1;</script>after', 'after'),
+    ('<style>p{}</style>t', 't'),
+    ('<![CDATA[cdata]]>after', 'cdata after'),
+    ('<br/>line<br>two', 'line two'),
+    ('a\nb\r\nc', 'a b c'),
+    ('<div><p>One</p>\n  <p>Two</p></div>', 'One   Two'),
+    ('&#8217;s &nbsp;x', '’s \xa0x'),
+    ("<img src='a>b'>t", 't'),
+    ('<a href="x">link</a> tail', 'link  tail'),
+    ('unclosed <b>bold', 'unclosed  bold'),
+    ('</p>stray end', 'stray end'),
+    ('&copy2023 &amp', '\xa92023 &'),
+    ('<!DOCTYPE html><html><body>hi</body></html>', 'hi'),
+    ("<?xml version='1.0'?>doc", 'doc'),
+    ('Caf&eacute; &#x263A;', 'Caf\xe9 ☺'),
+    ('<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>', '<script>alert(1)</script>'),
+    ('<SCRIPT>x</script>y', 'y'),
+    ("<a title=don't>x</a>", 'x'),
+    ('a<!-- unterminated', 'a<!-- unterminated'),
+    ('<template>tpl</template>x', 'x'),
+    ('<pre>  a\n  b</pre>', 'a   b'),
+    ('<p>a</p><![CDATA[]]>b', 'a   b'),
+    ('&notit; &#1; &#150;', '\xacit \x01 –'),
+    ('<p>&#9;</p>x', 'x'),
+]
+
+FRAGMENTS = ["<p>", "</p>", "<b>", "</b>", " ", "\n", "\r\n", "\t", "text", "word", "&amp;", "&lt;", "&nbsp;",
+             "&#8217;", "&#150;", "&#1", "&#x1F;", "&#0;", "&notit;", "&amp", "<br/>", "<!-- c -->", "<!--", "-->",
+             "<a href='x>y'>", "</a>", "<img src=x>", "<", "x>", "'", '="', "=", "<script>s</script>", "<style>",
+             "<![CDATA[c]]>", "<![CDATA[]]>", '<div class="a">', "</div>", "<template>", "<rt>", "<a t=it's>",
+             "<!x>", "<?p?>", "</ x>", "<p\nid=1>", "<x'=\"", "\x00"]
+
+
+def fuzz_cases(count: int, seed: int = 5):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(FRAGMENTS) for _ in range(rng.randrange(1, 15)))
+
+
+def check(texts) -> int:
+    mismatches = 0
+    for raw, expected in texts:
+        got = html_to_text(raw)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  {raw!r}\n    expected {expected!r}\n    got      {got!r}")
+    return mismatches
+
+
+def rate(count: int, size: int, seconds: float) -> str:
+    return f"{count / seconds:9.0f} texts/s {size / seconds / 1e6:6.1f} MB/s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--description-size", type=int, default=2000)
+    parser.add_argument("--content-size", type=int, default=8000)
+    parser.add_argument("--fuzz", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = list(iter_feed(make_rss(args.items, args.description_size, args.content_size)))
+    texts = [row["description"] for row in rows] + [row["content"] for row in rows]
+
+    failed = 0
+    for name, cases in (
+        ("golden", GOLDEN),
+        ("feed", ((text, soup_to_text(text)) for text in texts)),
+        ("fuzz", ((raw, soup_to_text(raw)) for raw in fuzz_cases(args.fuzz))),
+    ):
+        mismatches = check(cases)
+        print(f"{name:7}: {mismatches} differences")
+        failed += mismatches
+
+    size = sum(len(text) for text in texts)
+    started = time.perf_counter()
+    for text in texts:
+        soup_to_text(text)
+    print("BeautifulSoup per item :", rate(len(texts), size, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    html_to_text_many(texts)
+    print("regex extractor        :", rate(len(texts), size, time.perf_counter() - started))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
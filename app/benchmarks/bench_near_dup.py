@@ -0,0 +1,90 @@
+"""
+Story assignment with MinHash/LSH against exact TF-IDF cosine similarity of
+all pairs, on a synthetic syndicated corpus: every story is published by
+one to four outlets, each copy with a few words changed and an outlet
+byline. Reports the throughput of both and the recall of the LSH
+assignment: the share of copy pairs that end up in the same story, and the
+share of the pairs the exact cosine finds above --cosine. Run from the app
+directory:
+
+    python -m benchmarks.bench_near_dup --stories 2000 --words 60 --changes 3
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from itertools import combinations
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from near_dup import StoryIndex, band_keys, signature
+from benchmarks.feeds import WORDS
+
+OUTLETS = ("Wire", "Herald", "Gazette", "Tribune", "Courier", "Post")
+
+
+def make_corpus(stories: int, words: int, changes: int, seed: int = 3):
+    # Returns the texts and the story each text was copied from
+    rng = random.Random(seed)
+    vocabulary = [f"{word}{i}" for word in WORDS for i in range(50)]
+    texts, origins = [], []
+    for story in range(stories):
+        original = [rng.choice(vocabulary) for _ in range(words)]
+        for outlet in rng.sample(OUTLETS, rng.randint(1, 4)):
+            copy = list(original)
+            for position in rng.sample(range(words), changes):
+                copy[position] = rng.choice(vocabulary)
+            texts.append(f"{outlet}: " + " ".join(copy))
+            origins.append(story)
+    order = list(range(len(texts)))
+    rng.shuffle(order)
+    return [texts[i] for i in order], [origins[i] for i in order]
+
+
+def same_group_pairs(groups):
+    members = defaultdict(list)
+    for index, group in enumerate(groups):
+        members[group].append(index)
+    return {pair for ids in members.values() for pair in combinations(ids, 2)}
+
+
+def recall(expected, found) -> float:
+    return len(expected & found) / len(expected) if expected else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=60)
+    parser.add_argument("--changes", type=int, default=3)
+    parser.add_argument("--cosine", type=float, default=0.8)
+    args = parser.parse_args()
+
+    texts, origins = make_corpus(args.stories, args.words, args.changes)
+    print(f"{len(texts)} articles, {len(same_group_pairs(origins))} copy pairs")
+
+    started = time.perf_counter()
+    index = StoryIndex()
+    stories = []
+    for article_id, text in enumerate(texts):
+        sig = signature(text)
+        stories.append(index.assign(article_id, sig, band_keys(sig)))
+    lsh_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matrix = TfidfVectorizer().fit_transform(texts)
+    scores = cosine_similarity(matrix, dense_output=False).tocoo()
+    cosine_pairs = {(i, j) for i, j, score in zip(scores.row, scores.col, scores.data)
+                    if i < j and score >= args.cosine}
+    cosine_seconds = time.perf_counter() - started
+
+    copies = same_group_pairs(origins)
+    assigned = same_group_pairs(stories)
+    print(f"MinHash/LSH assign   : {len(texts) / lsh_seconds:9.0f} articles/s")
+    print(f"TF-IDF cosine pairs  : {len(texts) / cosine_seconds:9.0f} articles/s")
+    print(f"recall, copy pairs   : {recall(copies, assigned):.3f}")
+    print(f"recall, cosine pairs : {recall(cosine_pairs, assigned):.3f} ({len(cosine_pairs)} pairs >= {args.cosine})")
+    print(f"precision            : {recall(assigned, copies):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Articles per second of the ML preprocessing: the previous per-article
+nlp(text) with the full pipeline, the batched nlp.pipe pipeline without
+parser/NER, and a second pass served from the processed-text cache.
+Run from the app directory:
+
+    python -m benchmarks.bench_preprocess --articles 500
+"""
+import argparse
+import random
+import time
+import spacy
+from preprocess import preprocess_texts, content_hash
+from benchmarks.feeds import WORDS
+
+
+def make_texts(count: int, words: int = 300, seed: int = 1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words)) + "." for _ in range(count)]
+
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:10.1f} articles/s ({seconds:.2f} s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=500)
+    args = parser.parse_args()
+    texts = make_texts(args.articles)
+
+    full_nlp = spacy.load("en_core_web_sm")
+    started = time.perf_counter()
+    before = [" ".join(t.lemma_ for t in full_nlp(text.lower()) if not t.is_stop and not t.is_punct) for text in texts]
+    print("per article, full pipeline :", rate(len(texts), time.perf_counter() - started))
+
+    started = time.perf_counter()
+    after = preprocess_texts(texts)
+    print("nlp.pipe, parser/ner off   :", rate(len(texts), time.perf_counter() - started))
+    mismatches = sum(a != b for a, b in zip(before, after))
+    print(f"outputs differing from the full pipeline: {mismatches}/{len(texts)}")
+
+    # Cache hits only cost the content hash comparison
+    cache = {content_hash(text): processed for text, processed in zip(texts, after)}
+    started = time.perf_counter()
+    cached = [cache[content_hash(text)] for text in texts]
+    print("cached                     :", rate(len(cached), time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
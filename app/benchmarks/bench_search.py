@@ -0,0 +1,100 @@
+"""
+Latency of /search on a synthetic corpus. Builds an SQLite database with
+--articles articles (inserted through the FTS triggers, so the insert rate
+includes indexing), then times rare, common, phrase, prefix and filtered
+queries, newest first ordering and the second page of a common one. The
+database is thrown away unless --db names a file, which is reused by later
+runs. Run from the app directory:
+
+    python -m benchmarks.bench_search --articles 1000000 --db /tmp/search.db
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from database import make_engine
+from models.article import Article
+from models.news_enrty import Base
+from search import create_search_index, search_articles
+from benchmarks.feeds import WORDS
+
+BATCH = 5000
+
+
+def populate(engine, count: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocabulary = [f"{word}{i}" for word in WORDS for i in range(200)]
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        for first in range(0, count, BATCH):
+            rows = []
+            for i in range(first, min(first + BATCH, count)):
+                rows.append({
+                    "uid": f"{i:040d}",
+                    "news_entry_id": i % 50,
+                    "title": " ".join(rng.choice(WORDS) for _ in range(6)),
+                    "description": " ".join(rng.choice(vocabulary) for _ in range(40)),
+                    "content": " ".join(rng.choice(vocabulary) for _ in range(150)),
+                    "creator": f"Author {i % 300}",
+                    "category": rng.choice(WORDS).title(),
+                    "published_at": start + timedelta(minutes=i),
+                })
+            conn.execute(insert(Article), rows)
+
+
+def timed(db, runs: int, **params):
+    durations, results, cursor = [], [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        results, cursor = search_articles(db, **params)
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations), len(results), cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", help="database file to build once and reuse")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.db or os.path.join(directory, "search.db")
+        populated = os.path.exists(path)
+        engine = make_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        create_search_index(engine)
+        if not populated:
+            started = time.perf_counter()
+            populate(engine, args.articles)
+            seconds = time.perf_counter() - started
+            print(f"indexed insert: {args.articles / seconds:8.0f} articles/s")
+
+        since = datetime(2025, 1, 1) + timedelta(minutes=args.articles * 9 // 10)
+        cases = [
+            ("rare term", {"query": "market7 budget11"}),
+            ("common term", {"query": "storm"}),
+            ("  newest", {"query": "storm", "sort": "newest"}),
+            ("phrase", {"query": '"storm police"'}),
+            ("prefix", {"query": "vaccine1*"}),
+            ("raw OR", {"query": "film3 OR river4", "raw": True}),
+            ("feed filter", {"query": "court12", "feed_id": 3}),
+            ("date filter", {"query": "court12", "since": since}),
+        ]
+        with sessionmaker(bind=engine)() as db:
+            for name, params in cases:
+                median, count, cursor = timed(db, args.runs, **params)
+                print(f"{name:12}: {median:8.2f} ms median, {count} results")
+                if name == "common term" and cursor:
+                    median, count, _ = timed(db, args.runs, cursor=cursor, **params)
+                    print(f"{'  page 2':12}: {median:8.2f} ms median, {count} results")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import random
+
+# Synthetic feed generators shared by the benchmarks
+
+WORDS = ("market", "police", "election", "storm", "league", "minister", "court",
+         "company", "river", "vaccine", "festival", "border", "budget", "film")
+
+
+def _paragraphs(rng: random.Random, size: int) -> str:
+    parts = []
+    length = 0
+    while length < size:
+        text = " ".join(rng.choice(WORDS) for _ in range(12))
+        parts.append(f'<p><span>{text} &amp; more</span> <a href="https://example.com/{rng.randrange(10**6)}">link</a> &#8217;s</p>')
+        length += len(parts[-1])
+    return "\n".join(parts)
+
+
+# prefix makes the links and guids of one synthetic feed unique, first is the
+# number of the first item (the newest items of a feed that moves on)
+def make_rss(items: int, description_size: int = 1000, content_size: int = 4000, seed: int = 1,
+             prefix: str = "", first: int = 0) -> bytes:
+    rng = random.Random(seed)
+    body = []
+    for i in range(first, first + items):
+        body.append(f"""<item>
+<title>Story {i} {rng.choice(WORDS)}</title>
+<link>https://example.com/news/{prefix}{i}</link>
+<guid isPermaLink="false">https://example.com/{prefix}?p={i}</guid>
+<pubDate>Wed, 04 Jun 2025 16:00:59 +0000</pubDate>
+<dc:creator><![CDATA[Author {i % 7}]]></dc:creator>
+<category><![CDATA[{rng.choice(WORDS).title()}]]></category>
+<description><![CDATA[{_paragraphs(rng, description_size)}]]></description>
+<content:encoded><![CDATA[{_paragraphs(rng, content_size)}]]></content:encoded>
+<media:thumbnail url="https://example.com/img/{i}.jpg" width="300" height="200"/>
+</item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:media="http://search.yahoo.com/mrss/">
+<channel><title>Synthetic feed</title><link>https://example.com/</link><ttl>30</ttl>
+{"".join(body)}
+</channel></rss>""".encode("utf-8")
+
+
+def make_atom(items: int, description_size: int = 1000, content_size: int = 4000, seed: int = 1,
+              prefix: str = "", first: int = 0) -> bytes:
+    rng = random.Random(seed)
+    body = []
+    for i in range(first, first + items):
+        body.append(f"""<entry>
+<title>Story {i} {rng.choice(WORDS)}</title>
+<link rel="alternate" href="https://example.com/news/{prefix}{i}"/>
+<id>urn:example:{prefix}{i}</id>
+<published>2025-06-04T16:00:59Z</published>
+<updated>2025-06-04T16:00:59Z</updated>
+<author><name>Author {i % 7}</name></author>
+<category term="{rng.choice(WORDS).title()}"/>
+<summary type="html"><![CDATA[{_paragraphs(rng, description_size)}]]></summary>
+<content type="html"><![CDATA[{_paragraphs(rng, content_size)}]]></content>
+</entry>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>Synthetic feed</title><id>urn:example</id>
+{"".join(body)}
+</feed>""".encode("utf-8")
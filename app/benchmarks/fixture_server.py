@@ -0,0 +1,171 @@
+"""
+Local stand-in for the publishers' RSS/Atom feeds, for the load test and
+for trying the app without hitting real sites. /feed/<n>.xml serves feed n
+as RSS and /feed/<n>.atom as Atom, each with its own guids. With
+--rotate-seconds the feeds move on by --new-items items every period, as a
+live feed would. Responses carry an ETag and answer If-None-Match with 304.
+A share of the requests (--error-rate) fails with a 500, a 503 with
+Retry-After or a truncated document, and every response is delayed by
+--latency-ms plus up to --jitter-ms. Query parameters items, latency_ms and
+error_rate override the settings per request. Run from the app directory:
+
+    python -m benchmarks.fixture_server --port 8765 --items 50 --latency-ms 100 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.feeds import make_atom, make_rss
+
+_PATH = re.compile(r"^/feed/(\d+)\.(xml|atom)$")
+ERRORS = ("500", "503", "truncated")
+
+
+@lru_cache(maxsize=4096)
+def feed_document(feed: int, kind: str, items: int, first: int, description_size: int,
+                  content_size: int) -> bytes:
+    make = make_rss if kind == "xml" else make_atom
+    return make(items, description_size, content_size, seed=feed * 100003 + first, prefix=f"f{feed}/", first=first)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, items: int = 20, description_size: int = 1000, content_size: int = 4000,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, rotate_seconds: float = 0,
+                 new_items: int = 5, seed: int = 1):
+        super().__init__(address, FixtureHandler)
+        self.items = items
+        self.description_size = description_size
+        self.content_size = content_size
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rotate_seconds = rotate_seconds
+        self.new_items = new_items
+        self.started = time.monotonic()
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str, size: int = 0):
+        with self._lock:
+            self.stats[key] += 1
+            self.stats["bytes"] += size
+
+    def first_item(self) -> int:
+        if not self.rotate_seconds:
+            return 0
+        return int((time.monotonic() - self.started) / self.rotate_seconds) * self.new_items
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server: FixtureServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # One line per request would dominate a load test
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.count("requests")
+        url = urlparse(self.path)
+        match = _PATH.match(url.path)
+        if not match:
+            server.count("404")
+            self._send(404)
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        latency = float(query.get("latency_ms", server.latency_ms)) + server.rng.uniform(0, server.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+        feed, kind = int(match.group(1)), match.group(2)
+        items = int(query.get("items", server.items))
+        body = feed_document(feed, kind, items, server.first_item(), server.description_size, server.content_size)
+        content_type = "application/rss+xml" if kind == "xml" else "application/atom+xml"
+
+        if server.rng.random() < float(query.get("error_rate", server.error_rate)):
+            error = server.rng.choice(ERRORS)
+            server.count(f"error_{error}")
+            if error == "500":
+                self._send(500, b"Internal Server Error")
+            elif error == "503":
+                self._send(503, b"Service Unavailable", {"Retry-After": "120"})
+            else:
+                self._send(200, body[:len(body) // 2], {"Content-Type": content_type})
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            server.count("304")
+            self._send(304, headers={"ETag": etag})
+            return
+        server.count("200", size=len(body))
+        self._send(200, body, {"Content-Type": content_type, "ETag": etag})
+
+    do_HEAD = do_GET
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **settings) -> FixtureServer:
+    # Serves from a daemon thread; port 0 picks a free port, see server.url
+    server = FixtureServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--description-size", type=int, default=1000)
+    parser.add_argument("--content-size", type=int, default=4000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rotate-seconds", type=float, default=0)
+    parser.add_argument("--new-items", type=int, default=5)
+
+
+def server_settings(args) -> dict:
+    return {name: getattr(args, name) for name in (
+        "items", "description_size", "content_size", "latency_ms", "jitter_ms", "error_rate",
+        "rotate_seconds", "new_items",
+    )}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = FixtureServer((args.host, args.port), **server_settings(args))
+    print(f"serving {server.url}/feed/<n>.xml and {server.url}/feed/<n>.atom")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+End-to-end load test: starts the fixture feed server and, in a child
+process, the API (uvicorn, on a throwaway database), registers --feeds feeds
+through POST /news_entries, schedules them through POST /schedule_tasks and
+pulls their scheduled runs forward, spread over --ramp seconds, for --rounds
+rounds. While the scheduler fetches, --readers clients keep calling the read
+endpoints. With --workers N the API runs with FETCH_MODE=queue and N worker
+processes fetch instead. Writes JSON with the feed run throughput and stage percentiles,
+the stored article rate and the API latency per route. Run from the app
+directory:
+
+    python -m benchmarks.load_test --feeds 500 --rounds 2 --latency-ms 200 --error-rate 0.02 --output load.json
+    python -m benchmarks.load_test --feeds 500 --workers 4 --worker-concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+import httpx
+from benchmarks.fixture_server import add_arguments, server_settings, start_server
+from benchmarks.results import check_baseline, metric, write_results
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Feeds per POST /news_entries and /schedule_tasks call
+BATCH = 1000
+READ_REQUESTS = (
+    ("articles", "/articles?limit=50"),
+    ("search", "/search?q=storm&limit=20"),
+    ("news_entries", "/fetch_all_entry/?limit=100"),
+    ("feed_stats", "/feed-stats?hours=1"),
+    ("fetch_feed", "/fetch_feed/1"),
+    ("job_result", "/job-result?feed_id=1"),
+)
+STAGES = ("queue", "connect", "wait", "download", "parse", "clean", "store", "total")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port: int):
+    # The API process: uvicorn in the main thread, and a thread taking
+    # "pull <ramp> <seed>" commands from the load test on stdin
+    import uvicorn
+    import main as app_module
+    from scheduler import scheduler
+
+    def control():
+        for line in sys.stdin:
+            command, ramp, seed = line.split()
+            if command == "pull":
+                pull_runs_forward(scheduler, float(ramp), random.Random(int(seed)))
+                print("pulled", flush=True)
+
+    threading.Thread(target=control, name="load-test-control", daemon=True).start()
+    uvicorn.run(app_module.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def child_env(**extra) -> Dict[str, str]:
+    # faulthandler prints the Python stacks if a child crashes
+    return dict(os.environ, PYTHONFAULTHANDLER="1",
+                PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])), **extra)
+
+
+class ApiProcess:
+    """The API and its scheduler (or its fetch workers) in child processes, as they run in production."""
+
+    def __init__(self, workdir: str, port: int, workers: int = 0, worker_concurrency: int = 10):
+        self.workdir = workdir
+        self.env = child_env(FETCH_MODE="queue" if workers else "scheduler")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.load_test", "--serve-port", str(port)],
+            cwd=workdir, env=self.env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        self.worker_count = workers
+        self.worker_concurrency = worker_concurrency
+        self.workers: List[subprocess.Popen] = []
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    def check(self):
+        if self.process.poll() is not None:
+            raise RuntimeError(f"the API exited with status {self.process.returncode}")
+        for worker in self.workers:
+            if worker.poll() is not None:
+                raise RuntimeError(f"a fetch worker exited with status {worker.returncode}")
+
+    def wait_started(self, timeout: float = 120):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.check()
+            try:
+                httpx.get(self.base_url + "/metrics", timeout=5).raise_for_status()
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError("the API did not start")
+        # The API has created the tables, the workers can start
+        self.workers = [
+            subprocess.Popen([sys.executable, "-m", "worker", "--concurrency", str(self.worker_concurrency),
+                              "--poll-seconds", "0.5"], cwd=self.workdir, env=self.env)
+            for _ in range(self.worker_count)
+        ]
+
+    def pull_runs_forward(self, ramp: float, seed: int):
+        self.check()
+        self.process.stdin.write(f"pull {ramp} {seed}\n")
+        self.process.stdin.flush()
+        # The app may print to stdout too, wait for the reply line
+        for line in self.process.stdout:
+            if line.strip() == "pulled":
+                return
+        self.check()
+
+    def stop(self):
+        for process in self.workers + [self.process]:
+            process.terminate()
+        for process in self.workers + [self.process]:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class Readers:
+    """Clients calling the read endpoints in a loop until stopped."""
+
+    def __init__(self, base_url: str, count: int):
+        self.base_url = base_url
+        self.count = count
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="readers", daemon=True)
+
+    async def _client(self, client: httpx.AsyncClient, seed: int):
+        rng = random.Random(seed)
+        while not self.stopped.is_set():
+            name, path = rng.choice(READ_REQUESTS)
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 500:
+                    self.errors += 1
+            except httpx.HTTPError:
+                self.errors += 1
+            self.latencies[name].append((time.perf_counter() - started) * 1000)
+
+    async def _run(self):
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=60) as client:
+            await asyncio.gather(*(self._client(client, seed) for seed in range(self.count)))
+
+    def start(self):
+        if self.count:
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+def register_feeds(client: httpx.Client, fixture_url: str, args) -> List[int]:
+    ids = []
+    for first in range(0, args.feeds, BATCH):
+        entries = [
+            {
+                "name": f"load feed {n}",
+                "url": f"{fixture_url}/feed/{n}.{'atom' if n % 100 < args.atom_percent else 'xml'}",
+                "news_count": args.items,
+                "auto_dialer": True,
+                "delay": 1,
+            }
+            for n in range(first, min(first + BATCH, args.feeds))
+        ]
+        response = client.post("/news_entries", json=entries)
+        response.raise_for_status()
+        ids.extend(created["id"] for created in response.json()["data"])
+    for first in range(0, len(ids), BATCH):
+        client.post("/schedule_tasks", json=ids[first:first + BATCH]).raise_for_status()
+    return ids
+
+
+def pull_runs_forward(scheduler, ramp: float, rng: random.Random):
+    # The jobs run hours apart; move the next run of each into the ramp window.
+    # The leases of the last round would make the runs skip, so drop them.
+    from sqlalchemy import delete, select, update
+    from config import FETCH_MODE
+    from database import SessionLocal
+    from models.feed_queue import FeedQueueItem
+    from models.job_lock import JobLock
+    with SessionLocal() as db:
+        db.execute(delete(JobLock))
+        if FETCH_MODE == "queue":
+            now = datetime.utcnow()
+            for news_id in db.scalars(select(FeedQueueItem.news_entry_id)).all():
+                db.execute(update(FeedQueueItem).where(FeedQueueItem.news_entry_id == news_id)
+                           .values(due_at=now + timedelta(seconds=rng.uniform(0, ramp))))
+        db.commit()
+    if FETCH_MODE == "queue":
+        return
+    now = datetime.now().astimezone()
+    for job in scheduler.get_jobs():
+        if job.id.startswith("feed_"):
+            job.modify(next_run_time=now + timedelta(seconds=rng.uniform(0, ramp)))
+
+
+def count_runs() -> int:
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from models.feed_run import FeedRun
+    with SessionLocal() as db:
+        return db.scalar(select(func.count(FeedRun.id)))
+
+
+def run_metrics(started_at: datetime) -> Dict[str, Dict]:
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from feed_metrics import percentile
+    from models.article import Article
+    from models.feed_run import FeedRun
+    metrics = {}
+    with SessionLocal() as db:
+        runs = list(db.scalars(select(FeedRun).where(FeedRun.started_at >= started_at)))
+        articles = db.scalar(select(func.count(Article.id)))
+    for stage in STAGES:
+        values = sorted(getattr(run, f"{stage}_ms") or 0.0 for run in runs)
+        metrics[f"run_{stage}_p50_ms"] = metric(percentile(values, 50) or 0, "ms", better="lower")
+        metrics[f"run_{stage}_p95_ms"] = metric(percentile(values, 95) or 0, "ms", better="lower")
+    failed = sum(1 for run in runs if run.status_code not in (200, 304))
+    metrics["run_error_share"] = metric(failed / len(runs) if runs else 0, "share", better="lower")
+    return metrics, len(runs), articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feeds", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--ramp", type=float, default=10, help="seconds the runs of a round are spread over")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=0, help="fetch worker processes, 0 runs the scheduler")
+    parser.add_argument("--worker-concurrency", type=int, default=10)
+    parser.add_argument("--atom-percent", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for the runs of a round")
+    parser.add_argument("--output", help="JSON file, printed when omitted")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.serve_port:
+        serve(args.serve_port)
+        return
+    # Paths are given relative to where the test was started
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    # The app keeps its database, logs and data next to the working directory
+    workdir = tempfile.mkdtemp(prefix="newswire-load-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    fixture = start_server(**server_settings(args))
+    api = ApiProcess(workdir, free_port(), args.workers, args.worker_concurrency)
+    try:
+        api.wait_started()
+        readers = Readers(api.base_url, args.readers)
+        with httpx.Client(base_url=api.base_url, timeout=120) as client:
+            started = time.perf_counter()
+            ids = register_feeds(client, fixture.url, args)
+            register_seconds = time.perf_counter() - started
+
+            started_at = datetime.utcnow()
+            started = time.perf_counter()
+            readers.start()
+            expected = 0
+            try:
+                for number in range(args.rounds):
+                    expected += len(ids)
+                    api.pull_runs_forward(args.ramp, seed=number)
+                    deadline = time.monotonic() + args.ramp + args.timeout
+                    while count_runs() < expected and time.monotonic() < deadline:
+                        api.check()
+                        time.sleep(0.5)
+                # A crash after the last run was counted fails the test too
+                api.check()
+            finally:
+                readers.stop()
+            seconds = time.perf_counter() - started
+    finally:
+        api.stop()
+        fixture.shutdown()
+
+    metrics, runs, articles = run_metrics(started_at)
+    metrics["register_feeds_per_s"] = metric(len(ids) / register_seconds, "feeds/s")
+    metrics["feed_runs_per_s"] = metric(runs / seconds, "runs/s")
+    metrics["articles_stored_per_s"] = metric(articles / seconds, "articles/s")
+    reads = sum(len(values) for values in readers.latencies.values())
+    metrics["api_reads_per_s"] = metric(reads / seconds, "requests/s")
+    metrics["api_read_error_share"] = metric(readers.errors / reads if reads else 0, "share", better="lower")
+    from feed_metrics import percentile
+    for name, values in readers.latencies.items():
+        values.sort()
+        metrics[f"api_{name}_p50_ms"] = metric(percentile(values, 50), "ms", better="lower")
+        metrics[f"api_{name}_p95_ms"] = metric(percentile(values, 95), "ms", better="lower")
+
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    params.update(completed_runs=runs, expected_runs=expected, articles=articles, seconds=round(seconds, 2),
+                  fixture=dict(fixture.stats))
+    results = write_results("load", metrics, params, output)
+    check_baseline(results, baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
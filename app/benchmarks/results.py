@@ -0,0 +1,74 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Machine readable benchmark results. A result file holds the environment
+# (commit, Python, CPU count) and a flat map of metrics:
+#   {"name": {"value": 12.3, "unit": "ms", "better": "lower"}}
+# so the files of two commits can be compared metric by metric.
+
+
+def metric(value: float, unit: str, better: str = "higher") -> Dict:
+    return {"value": round(float(value), 4), "unit": unit, "better": better}
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def write_results(suite: str, metrics: Dict[str, Dict], params: Dict, path: Optional[str] = None) -> Dict:
+    results = {"suite": suite, "environment": environment(), "params": params, "metrics": metrics}
+    text = json.dumps(results, indent=2)
+    if path:
+        with open(path, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    return results
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Metrics of current that are worse than in baseline by more than
+    tolerance (0.1 = 10%), as printable lines.
+    """
+    regressions = []
+    for name, now in current["metrics"].items():
+        before = baseline["metrics"].get(name)
+        if not before or not before["value"]:
+            continue
+        change = (now["value"] - before["value"]) / before["value"]
+        worse = change < -tolerance if now["better"] == "higher" else change > tolerance
+        if worse:
+            regressions.append(f"{name}: {before['value']} -> {now['value']} {now['unit']} ({change:+.0%})")
+    return regressions
+
+
+def check_baseline(current: Dict, baseline_path: Optional[str], tolerance: float):
+    # Exits with status 1 when a metric regressed against the baseline file
+    if not baseline_path:
+        return
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    regressions = compare(current, baseline, tolerance)
+    print(f"compared with {baseline_path} (commit {baseline['environment'].get('commit')}): "
+          f"{len(regressions)} regressions over {tolerance:.0%}", file=sys.stderr)
+    for line in regressions:
+        print("  " + line, file=sys.stderr)
+    if regressions:
+        sys.exit(1)
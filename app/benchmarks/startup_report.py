@@ -0,0 +1,66 @@
+"""
+Cold start report of the API: wall time and peak RSS of `import main` in a
+fresh interpreter, the slowest imports from `python -X importtime`, and
+whether the ML stack was pulled in. Prints JSON for CI. Run from the app
+directory:
+
+    python -m benchmarks.startup_report --top 15 --fail-on-heavy
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ("spacy", "sklearn", "pandas", "matplotlib", "seaborn")
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+from config import FETCH_MODE
+if FETCH_MODE != "queue":
+    from scheduler import scheduler
+    scheduler.shutdown(wait=False)
+print(json.dumps({
+    "import_seconds": round(elapsed, 4),
+    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "heavy_modules_loaded": sorted(m for m in %r if m in sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr: str):
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--fail-on-heavy", action="store_true", help="exit 1 if the ML stack loads at startup")
+    args = parser.parse_args()
+
+    probe = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE % (HEAVY_MODULES,)],
+                           capture_output=True, text=True)
+    if probe.returncode != 0:
+        sys.stderr.write(probe.stderr)
+        sys.exit(probe.returncode)
+    report = json.loads(probe.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(probe.stderr)
+    # Packages only (no dotted submodules), their cumulative time includes the children
+    top_level = [row for row in imports if not row["module"].startswith(" ") and "." not in row["module"]]
+    report["slowest_imports"] = sorted(top_level, key=lambda row: row["cumulative_us"], reverse=True)[:args.top]
+    print(json.dumps(report, indent=2))
+    if args.fail_on_heavy and report["heavy_modules_loaded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
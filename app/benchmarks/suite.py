@@ -0,0 +1,139 @@
+"""
+Micro-benchmarks of the hot paths, written as JSON so the results of two
+commits can be compared: feed parsing (RSS and Atom), HTML cleaning, ML
+preprocessing, near-duplicate signatures and the full TF-IDF/cosine/KMeans
+clustering. Each case runs --repeat times after a warm-up and reports the
+median. With --baseline the run exits with status 1 when a metric is worse
+than in the baseline file by more than --tolerance. Run from the app
+directory:
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --baseline bench.json --only parse,html
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict
+from benchmarks.feeds import WORDS, make_atom, make_rss
+from benchmarks.results import check_baseline, metric, write_results
+
+
+def median_seconds(function: Callable, repeat: int) -> float:
+    function()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def make_texts(count: int, words: int, seed: int = 1):
+    rng = random.Random(seed)
+    vocabulary = [f"{word}{i}" for word in WORDS for i in range(100)]
+    return [" ".join(rng.choice(vocabulary) for _ in range(words)) for _ in range(count)]
+
+
+def bench_parse(args) -> Dict[str, Dict]:
+    from feed_parser import parse_feed
+    results = {}
+    for name, make in (("rss", make_rss), ("atom", make_atom)):
+        document = make(args.items, args.description_size, args.content_size)
+        seconds = median_seconds(lambda: parse_feed(document), args.repeat)
+        results[f"parse_{name}_items_per_s"] = metric(args.items / seconds, "items/s")
+        results[f"parse_{name}_mb_per_s"] = metric(len(document) / seconds / 1e6, "MB/s")
+    return results
+
+
+def bench_html(args) -> Dict[str, Dict]:
+    from feed_parser import parse_feed
+    from html_text import html_to_text_many
+    rows = parse_feed(make_rss(args.items, args.description_size, args.content_size))
+    texts = [row["description"] for row in rows] + [row["content"] for row in rows]
+    size = sum(len(text) for text in texts)
+    seconds = median_seconds(lambda: html_to_text_many(texts), args.repeat)
+    return {
+        "html_clean_texts_per_s": metric(len(texts) / seconds, "texts/s"),
+        "html_clean_mb_per_s": metric(size / seconds / 1e6, "MB/s"),
+    }
+
+
+def bench_preprocess(args) -> Dict[str, Dict]:
+    from preprocess import get_nlp, preprocess_texts
+    texts = [text + "." for text in make_texts(args.articles, args.words)]
+    get_nlp()
+    seconds = median_seconds(lambda: preprocess_texts(texts), args.repeat)
+    return {"preprocess_articles_per_s": metric(len(texts) / seconds, "articles/s")}
+
+
+def bench_near_dup(args) -> Dict[str, Dict]:
+    from near_dup import StoryIndex, band_keys, signature
+    texts = make_texts(args.articles, args.words // 5)
+
+    def assign():
+        index = StoryIndex()
+        for article_id, text in enumerate(texts):
+            sig = signature(text)
+            index.assign(article_id, sig, band_keys(sig))
+
+    seconds = median_seconds(assign, args.repeat)
+    return {"near_dup_articles_per_s": metric(len(texts) / seconds, "articles/s")}
+
+
+def bench_cluster(args) -> Dict[str, Dict]:
+    from sklearn.cluster import KMeans
+    from sklearn.metrics.pairwise import cosine_similarity
+    from corpus import tfidf, vectorizer
+    texts = make_texts(args.articles, args.words)
+    counts = vectorizer.transform(texts)
+
+    def cluster():
+        matrix = tfidf(counts)
+        cosine_similarity(matrix)
+        KMeans(n_clusters=3, n_init=3, random_state=0).fit_predict(matrix)
+
+    return {
+        "vectorize_articles_per_s": metric(len(texts) / median_seconds(lambda: vectorizer.transform(texts),
+                                                                       args.repeat), "articles/s"),
+        "cluster_seconds": metric(median_seconds(cluster, args.repeat), "s", better="lower"),
+    }
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "html": bench_html,
+    "preprocess": bench_preprocess,
+    "near_dup": bench_near_dup,
+    "cluster": bench_cluster,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"comma separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--description-size", type=int, default=2000)
+    parser.add_argument("--content-size", type=int, default=8000)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--output", help="JSON file, printed when omitted")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    metrics = {}
+    for name in names:
+        metrics.update(BENCHMARKS[name](args))
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    results = write_results("micro", metrics, params, args.output)
+    check_baseline(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
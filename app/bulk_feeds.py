@@ -0,0 +1,124 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from lxml import etree
+from sqlalchemy import insert, select, update
+from models.news_enrty import NewsEntry
+from schemas.news_request import NewsEntrySchema
+from scheduler import create_task
+
+# Largest batch accepted by the bulk endpoints
+MAX_BATCH = 5000
+# Ids / urls per IN (...) query
+QUERY_CHUNK = 500
+
+
+def entry_row(news_entry: NewsEntrySchema) -> Dict:
+    return {
+        "name": news_entry.name,
+        "url": news_entry.url,
+        "news_count": news_entry.news_count,
+        "auto_dialer": news_entry.auto_dialer,
+        "author": news_entry.author,
+        "categories": ",".join(news_entry.categories) if news_entry.categories else None,
+        "tags": ",".join(news_entry.tags) if news_entry.tags else None,
+        "delay": news_entry.delay,
+    }
+
+
+def _chunks(values: List, size: int = QUERY_CHUNK) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def parse_opml(content: bytes, news_count: int = 10, auto_dialer: bool = False, delay: Optional[int] = None,
+               author: Optional[str] = None) -> List[NewsEntrySchema]:
+    """
+    Feeds of an OPML subscription list. The text of the enclosing outlines
+    becomes the categories of a feed; the other fields come from the
+    arguments since OPML has no place for them.
+    """
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = etree.fromstring(content, parser)
+    if root is None:
+        raise ValueError("not an OPML document")
+
+    entries = []
+    for outline in root.iter("outline"):
+        url = outline.get("xmlUrl") or outline.get("xmlurl")
+        if not url:
+            continue
+        categories = [
+            parent.get("text") or parent.get("title")
+            for parent in outline.iterancestors("outline")
+            if parent.get("text") or parent.get("title")
+        ][::-1]
+        entries.append(NewsEntrySchema(
+            name=outline.get("title") or outline.get("text") or url,
+            url=url,
+            news_count=news_count,
+            auto_dialer=auto_dialer,
+            author=author,
+            categories=categories,
+            delay=delay,
+        ))
+    return entries
+
+
+def create_entries(db, news_entries: List[NewsEntrySchema]) -> Tuple[List[Dict], List[str]]:
+    """
+    Inserts the entries in one transaction. Urls already stored, or repeated
+    in the batch, are skipped. Returns the created {id, url} and the skipped urls.
+    """
+    urls = list(dict.fromkeys(entry.url for entry in news_entries))
+    existing = set()
+    for chunk in _chunks(urls):
+        existing.update(db.scalars(select(NewsEntry.url).where(NewsEntry.url.in_(chunk))))
+
+    rows, skipped, seen = [], [], set(existing)
+    for entry in news_entries:
+        if entry.url in seen:
+            skipped.append(entry.url)
+            continue
+        seen.add(entry.url)
+        rows.append(entry_row(entry))
+
+    created = []
+    try:
+        if rows:
+            result = db.execute(
+                insert(NewsEntry).returning(NewsEntry.id, NewsEntry.url, sort_by_parameter_order=True), rows
+            )
+            created = [{"id": news_id, "url": url} for news_id, url in result]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return created, skipped
+
+
+def schedule_entries(db, news_ids: List[int]) -> Tuple[List[str], Dict[int, str]]:
+    """
+    Schedules the entries that have auto_dialer on and a positive delay, and
+    marks them scheduled in one commit. Returns the job ids and the reason
+    each other id was skipped.
+    """
+    entries = {}
+    for chunk in _chunks(list(dict.fromkeys(news_ids))):
+        entries.update((entry.id, entry) for entry in db.scalars(select(NewsEntry).where(NewsEntry.id.in_(chunk))))
+
+    job_ids, skipped, scheduled_ids = [], {}, []
+    for news_id in news_ids:
+        entry = entries.get(news_id)
+        if entry is None:
+            skipped[news_id] = "not found"
+        elif not entry.auto_dialer:
+            skipped[news_id] = "auto_dialer is off"
+        elif not entry.delay or entry.delay <= 0:
+            skipped[news_id] = "delay must be greater than zero"
+        elif news_id not in scheduled_ids:
+            job_ids.append(create_task(entry))
+            scheduled_ids.append(news_id)
+
+    for chunk in _chunks(scheduled_ids):
+        db.execute(update(NewsEntry).where(NewsEntry.id.in_(chunk)).values(scheduled=True, poll_interval=None))
+    db.commit()
+    return job_ids, skipped
@@ -0,0 +1,128 @@
+import bisect
+import os
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+MODEL_PATH = "data/cluster_model.joblib"
+NUM_CLUSTERS = 3
+NUM_FEATURES = 2 ** 18
+TOP_K = 5
+# Rows of new articles compared against the corpus at a time
+SIMILARITY_CHUNK = 256
+
+
+class IncrementalClusterModel:
+    """
+    TF-IDF and KMeans state that is updated with only the new articles.
+
+    Term counts come from a stateless HashingVectorizer, so there is no
+    vocabulary to rebuild, and document frequencies are accumulated to derive
+    the IDF. Clusters are updated with MiniBatchKMeans.partial_fit and the top-k
+    most similar articles of each article are kept as sparse neighbour lists
+    instead of a dense N x N similarity matrix. Neighbour lists of older
+    articles are only ever extended with newer articles, scored with the IDF
+    of the time they were added.
+    """
+
+    def __init__(self, n_clusters: int = NUM_CLUSTERS, n_features: int = NUM_FEATURES, top_k: int = TOP_K):
+        self.n_clusters = n_clusters
+        self.n_features = n_features
+        self.top_k = top_k
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3)
+        self.fitted = False
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.term_counts = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.article_ids: List[int] = []
+        # article id -> [(score, neighbour id)] sorted by ascending score
+        self.neighbors: Dict[int, List[Tuple[float, int]]] = {}
+        self.last_article_id = 0
+
+    @property
+    def n_docs(self) -> int:
+        return self.term_counts.shape[0]
+
+    def idf(self) -> np.ndarray:
+        # Same smoothed IDF as TfidfVectorizer
+        return np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1
+
+    def tfidf(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        return normalize(sparse.csr_matrix(counts.multiply(self.idf())))
+
+    def partial_fit(self, article_ids: Sequence[int], texts: Sequence[str]):
+        if not article_ids:
+            return
+        counts = self.vectorizer.transform(texts).astype(np.float32)
+        self.doc_freq += np.bincount(counts.indices, minlength=self.n_features)
+        self.term_counts = sparse.vstack([self.term_counts, counts]).tocsr()
+        self.article_ids.extend(article_ids)
+        self.last_article_id = max(self.last_article_id, max(article_ids))
+
+        corpus = self.tfidf(self.term_counts)
+        new_rows = corpus[-len(article_ids):]
+        if self.fitted:
+            self.kmeans.partial_fit(new_rows)
+        elif self.n_docs >= self.n_clusters:
+            # The first fit needs at least one article per cluster
+            self.kmeans.partial_fit(corpus)
+            self.fitted = True
+        self._update_neighbors(corpus, self.n_docs - len(article_ids))
+
+    def _push(self, article_id: int, score: float, neighbor_id: int):
+        top = self.neighbors.setdefault(article_id, [])
+        if len(top) < self.top_k:
+            bisect.insort(top, (score, neighbor_id))
+        elif score > top[0][0]:
+            top.pop(0)
+            bisect.insort(top, (score, neighbor_id))
+
+    def _update_neighbors(self, corpus: sparse.csr_matrix, offset: int):
+        ids = self.article_ids
+        for start in range(offset, corpus.shape[0], SIMILARITY_CHUNK):
+            block = corpus[start:start + SIMILARITY_CHUNK]
+            # Sparse product, only pairs sharing a term are materialized
+            sims = (block @ corpus.T).tocsr()
+            for row in range(block.shape[0]):
+                index = start + row
+                cols = sims.indices[sims.indptr[row]:sims.indptr[row + 1]]
+                scores = sims.data[sims.indptr[row]:sims.indptr[row + 1]]
+                for col, score in zip(cols, scores):
+                    if col == index:
+                        continue
+                    # Old articles see the new one once, new pairs once from each side
+                    if col < offset:
+                        self._push(ids[col], float(score), ids[index])
+                    self._push(ids[index], float(score), ids[col])
+
+    def clusters(self) -> Dict[int, int]:
+        if not self.fitted:
+            return {}
+        labels = self.kmeans.predict(self.tfidf(self.term_counts))
+        return dict(zip(self.article_ids, labels.tolist()))
+
+    def top_neighbors(self, article_id: int) -> List[Dict[str, float]]:
+        return [{"article_id": neighbor, "score": round(score, 4)}
+                for score, neighbor in reversed(self.neighbors.get(article_id, []))]
+
+    def save(self, path: str = MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "IncrementalClusterModel":
+        if os.path.exists(path):
+            return joblib.load(path)
+        return cls()
+
+
+# Serializes updates of the persisted model between requests
+model_lock = threading.Lock()
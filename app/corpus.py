@@ -0,0 +1,217 @@
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sqlalchemy import select
+from config import CORPUS_DIR, CORPUS_SEGMENT_ROWS
+from cluster_model import NUM_FEATURES
+from models.article import Article
+from preprocess import preprocess_articles
+
+# On-disk corpus of the articles with content, for the ML path and offline
+# analyses. Each segment holds a contiguous id range:
+#   articles.parquet  metadata, text and the preprocessed tokens
+#   ids.npy, data.npy, indices.npy, indptr.npy
+#                     hashed term counts of the tokens as CSR arrays, loaded
+#                     memory-mapped
+# manifest.json lists the segments; it is replaced atomically, so readers
+# never see a half written segment.
+METADATA_COLUMNS = ("id", "news_entry_id", "story_id", "published_at", "fetched_at", "title", "link", "creator",
+                    "category")
+TEXT_COLUMNS = ("description", "content", "tokens")
+SCHEMA = pa.schema(
+    [("id", pa.int64()), ("news_entry_id", pa.int64()), ("story_id", pa.int64()),
+     ("published_at", pa.timestamp("us")), ("fetched_at", pa.timestamp("us"))]
+    + [(name, pa.string()) for name in METADATA_COLUMNS[5:] + TEXT_COLUMNS]
+)
+CSR_ARRAYS = ("data", "indices", "indptr")
+
+# Same tokenization as TfidfVectorizer and the incremental cluster model
+vectorizer = HashingVectorizer(n_features=NUM_FEATURES, alternate_sign=False, norm=None)
+
+
+def tfidf(counts: sparse.csr_matrix) -> sparse.csr_matrix:
+    # Smoothed IDF over the given rows, as TfidfVectorizer computes it
+    doc_freq = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + counts.shape[0]) / (1 + doc_freq)) + 1
+    return normalize(sparse.csr_matrix(counts.multiply(idf)))
+
+
+class Corpus:
+    def __init__(self, path: str = CORPUS_DIR):
+        self.path = path
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(os.path.join(self.path, "manifest.json")) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"n_features": NUM_FEATURES, "last_article_id": 0, "segments": []}
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(tmp_path, os.path.join(self.path, "manifest.json"))
+
+    @contextmanager
+    def lock(self):
+        # Serializes writers across processes (ML worker, export CLI)
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                self.manifest = self._read_manifest()
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    @property
+    def segments(self) -> List[Dict]:
+        return self.manifest["segments"]
+
+    @property
+    def last_article_id(self) -> int:
+        return self.manifest["last_article_id"]
+
+    def __len__(self):
+        return sum(segment["rows"] for segment in self.segments)
+
+    def _segments_in(self, first_id: Optional[int], last_id: Optional[int]) -> List[Dict]:
+        return [
+            segment for segment in self.segments
+            if (first_id is None or segment["last_id"] >= first_id)
+            and (last_id is None or segment["first_id"] <= last_id)
+        ]
+
+    def _write_segment(self, rows: Dict[str, list], counts: sparse.csr_matrix) -> Dict:
+        # Caller holds the lock
+        ids = np.asarray(rows["id"], dtype=np.int64)
+        name = f"{ids[0]:010d}-{ids[-1]:010d}"
+        directory = os.path.join(self.path, name)
+        tmp_directory = directory + ".tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        pq.write_table(pa.table(rows, schema=SCHEMA), os.path.join(tmp_directory, "articles.parquet"))
+        # One index dtype for indices and indptr, so scipy keeps the mapped arrays as they are
+        index_dtype = np.int32 if counts.nnz < 2 ** 31 else np.int64
+        np.save(os.path.join(tmp_directory, "ids.npy"), ids)
+        np.save(os.path.join(tmp_directory, "data.npy"), counts.data.astype(np.float32))
+        np.save(os.path.join(tmp_directory, "indices.npy"), counts.indices.astype(index_dtype))
+        np.save(os.path.join(tmp_directory, "indptr.npy"), counts.indptr.astype(index_dtype))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+        return {"name": name, "first_id": int(ids[0]), "last_id": int(ids[-1]), "rows": len(ids)}
+
+    def append(self, articles: Sequence[Article], tokens: Dict[int, str], last_article_id: int):
+        """
+        Writes the articles as a new segment and moves last_article_id, which
+        also covers the articles that were skipped (no content). Caller holds
+        the lock.
+        """
+        if articles:
+            rows = {name: [getattr(article, name) for article in articles] for name in SCHEMA.names[:-1]}
+            rows["tokens"] = [tokens[article.id] for article in articles]
+            counts = vectorizer.transform(rows["tokens"]).astype(np.float32)
+            self.segments.append(self._write_segment(rows, counts))
+        self.manifest["last_article_id"] = max(self.last_article_id, last_article_id)
+        self._write_manifest()
+
+    def compact(self):
+        # Merges all segments into one; the mapped arrays of a single
+        # segment are used without any copy
+        with self.lock():
+            if len(self.segments) < 2:
+                return
+            old = list(self.segments)
+            table = self.read_table()
+            _, counts = self.counts()
+            segment = self._write_segment(table.to_pydict(), counts)
+            self.manifest["segments"] = [segment]
+            self._write_manifest()
+            for previous in old:
+                if previous["name"] != segment["name"]:
+                    shutil.rmtree(os.path.join(self.path, previous["name"]), ignore_errors=True)
+
+    def _load(self, segment: Dict, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, segment["name"], f"{name}.npy"), mmap_mode="r")
+
+    def counts(self, first_id: Optional[int] = None,
+               last_id: Optional[int] = None) -> Tuple[np.ndarray, sparse.csr_matrix]:
+        """
+        Article ids and term counts of the articles in [first_id, last_id].
+        The CSR arrays are memory-mapped: only the pages of the rows used are
+        read, and a range within one segment is a view of the files.
+        """
+        blocks, id_blocks = [], []
+        for segment in self._segments_in(first_id, last_id):
+            ids = self._load(segment, "ids")
+            data, indices, indptr = (self._load(segment, name) for name in CSR_ARRAYS)
+            start = 0 if first_id is None else int(np.searchsorted(ids, first_id))
+            stop = len(ids) if last_id is None else int(np.searchsorted(ids, last_id, side="right"))
+            if start >= stop:
+                continue
+            low, high = indptr[start], indptr[stop]
+            row_ptr = indptr[start:stop + 1] if low == 0 else indptr[start:stop + 1] - low
+            blocks.append(sparse.csr_matrix((data[low:high], indices[low:high], row_ptr),
+                                            shape=(stop - start, self.manifest["n_features"]), copy=False))
+            id_blocks.append(ids[start:stop])
+        if not blocks:
+            return np.zeros(0, dtype=np.int64), sparse.csr_matrix((0, self.manifest["n_features"]), dtype=np.float32)
+        if len(blocks) == 1:
+            return id_blocks[0], blocks[0]
+        return np.concatenate(id_blocks), sparse.vstack(blocks, format="csr")
+
+    def read_table(self, columns: Optional[Sequence[str]] = None, first_id: Optional[int] = None,
+                   last_id: Optional[int] = None) -> pa.Table:
+        """
+        The Parquet columns asked for, of the articles in [first_id, last_id].
+        Only those columns of the segments in the range are read.
+        """
+        if columns is not None and "id" not in columns:
+            columns = ["id", *columns]
+        filters = []
+        if first_id is not None:
+            filters.append(("id", ">=", first_id))
+        if last_id is not None:
+            filters.append(("id", "<=", last_id))
+        tables = [
+            pq.read_table(os.path.join(self.path, segment["name"], "articles.parquet"), columns=columns,
+                          filters=filters or None, memory_map=True)
+            for segment in self._segments_in(first_id, last_id)
+        ]
+        if not tables:
+            return SCHEMA.empty_table() if columns is None else SCHEMA.empty_table().select(columns)
+        return pa.concat_tables(tables)
+
+
+def sync_corpus(db, corpus: Optional[Corpus] = None, segment_rows: int = CORPUS_SEGMENT_ROWS) -> Corpus:
+    """
+    Appends the articles stored since the last sync, one segment per
+    segment_rows articles. Tokens come from preprocess_articles, so articles
+    already lemmatized for the ML path are not processed again.
+    """
+    corpus = corpus or Corpus()
+    with corpus.lock():
+        while True:
+            batch = list(db.scalars(
+                select(Article).where(Article.id > corpus.last_article_id).order_by(Article.id).limit(segment_rows)
+            ))
+            if not batch:
+                break
+            articles = [article for article in batch if article.content]
+            tokens = preprocess_articles(db, articles)
+            corpus.append(articles, tokens, batch[-1].id)
+            # The loaded articles are not needed past their segment
+            db.expunge_all()
+    return corpus
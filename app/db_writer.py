@@ -0,0 +1,115 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional
+from database import SessionLocal
+from article_store import prepare_records, insert_records, store_articles
+from config import DB_BATCH_WRITES, DB_WRITE_BATCH_SIZE, DB_WRITE_MAX_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class ArticleWriter:
+    """
+    Single writer thread for the article inserts of fetch jobs. Requests
+    queued by many scheduler threads are committed together in one
+    transaction, so SQLite sees one writer instead of many competing ones.
+    """
+
+    def __init__(self, batch_size: int = DB_WRITE_BATCH_SIZE, max_latency: float = DB_WRITE_MAX_LATENCY):
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="article-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, news_id: Optional[int], rows: Iterable[Dict[str, str]]) -> Future:
+        future = Future()
+        records = prepare_records(news_id, rows)
+        if not records:
+            future.set_result({})
+            return future
+        self._ensure_started()
+        self._queue.put((records, future))
+        return future
+
+    def store(self, news_id: Optional[int], rows: Iterable[Dict[str, str]]) -> Dict[str, int]:
+        # Blocking helper with the same result as article_store.store_articles
+        return self.submit(news_id, rows).result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_latency
+            stop = False
+            # Collect more requests until the batch is full or the latency budget is spent
+            while size < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: List):
+        # Concurrent requests may carry the same article (a story syndicated
+        # by several feeds), it is inserted once, the first record wins
+        merged = {}
+        for records, _ in batch:
+            for record in records:
+                merged.setdefault(record["uid"], record)
+        records = list(merged.values())
+        try:
+            with SessionLocal() as db:
+                inserted = insert_records(db, records)
+                db.commit()
+        except Exception as e:
+            logger.error(f"article batch of {len(records)} rows failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        # A uid new to the table is reported to the first request that carried it
+        for records, future in batch:
+            new = {}
+            for record in records:
+                article_id = inserted.pop(record["uid"], None)
+                if article_id is not None:
+                    new[record["uid"]] = article_id
+            future.set_result(new)
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join(timeout=10)
+            self._thread = None
+
+
+article_writer = ArticleWriter()
+
+
+def save_articles(news_id: Optional[int], rows: List[Dict[str, str]]) -> Dict[str, int]:
+    if DB_BATCH_WRITES:
+        return article_writer.store(news_id, rows)
+    return store_articles(news_id, rows)
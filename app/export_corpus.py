@@ -0,0 +1,48 @@
+"""
+Brings the on-disk article corpus (see corpus.py) up to date with the
+database, and optionally writes a slice of it as standalone files for
+offline analysis: one Parquet file with the chosen columns and/or the
+TF-IDF matrix as a scipy .npz with the article ids.
+
+    python export_corpus.py [--compact] [--first-id N] [--last-id N]
+                            [--columns title,tokens] [--parquet out.parquet] [--npz out.npz]
+"""
+import argparse
+import numpy as np
+import pyarrow.parquet as pq
+from scipy import sparse
+from database import SessionLocal
+from corpus import Corpus, sync_corpus, tfidf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compact", action="store_true", help="merge the segments into one")
+    parser.add_argument("--first-id", type=int)
+    parser.add_argument("--last-id", type=int)
+    parser.add_argument("--columns", help="comma separated Parquet columns, all by default")
+    parser.add_argument("--parquet", help="write the selected rows and columns to this Parquet file")
+    parser.add_argument("--npz", help="write the TF-IDF matrix of the selected rows to this .npz file")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        corpus = sync_corpus(db)
+    if args.compact:
+        corpus.compact()
+    print(f"corpus: {len(corpus)} articles in {len(corpus.segments)} segments, "
+          f"synced up to article {corpus.last_article_id}")
+
+    if args.parquet:
+        columns = args.columns.split(",") if args.columns else None
+        table = corpus.read_table(columns, args.first_id, args.last_id)
+        pq.write_table(table, args.parquet)
+        print(f"wrote {table.num_rows} rows to {args.parquet}")
+    if args.npz:
+        ids, counts = corpus.counts(args.first_id, args.last_id)
+        sparse.save_npz(args.npz, tfidf(counts))
+        np.save(args.npz.rsplit(".", 1)[0] + "_ids.npy", ids)
+        print(f"wrote a {counts.shape[0]} x {counts.shape[1]} TF-IDF matrix to {args.npz}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# Limits of the in-memory scheduled results
+MAX_RESULTS_PER_FEED = 20
+MAX_BUFFER_BYTES = 64 * 1024 * 1024
+RESULT_TTL_SECONDS = 24 * 60 * 60
+
+
+class FeedResultBuffer:
+    """
+    Thread-safe ring buffer of the latest fetch results of each feed, bounded
+    by a count per feed, a total size in bytes and an age. When over the byte
+    budget the oldest result of the least recently used feed is evicted.
+    Every result gets an increasing sequence number that readers use as a
+    cursor to get only the results newer than their last read.
+    """
+
+    def __init__(self, max_per_feed: int = MAX_RESULTS_PER_FEED, max_bytes: int = MAX_BUFFER_BYTES,
+                 ttl: float = RESULT_TTL_SECONDS):
+        self.max_per_feed = max_per_feed
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # feed key -> deque of (seq, stored_at, size, result), in LRU order
+        self._feeds: "OrderedDict[Any, deque]" = OrderedDict()
+        self._seq = 0
+        self._bytes = 0
+
+    def append(self, feed_key: Any, result, size: Optional[int] = None) -> int:
+        if size is None:
+            size = len(result.model_dump_json())
+        with self._lock:
+            self._seq += 1
+            results = self._feeds.get(feed_key)
+            if results is None:
+                results = self._feeds[feed_key] = deque()
+            self._feeds.move_to_end(feed_key)
+            results.append((self._seq, time.monotonic(), size, result))
+            self._bytes += size
+            while len(results) > self.max_per_feed:
+                self._bytes -= results.popleft()[2]
+            self._evict()
+            return self._seq
+
+    def _evict(self):
+        # Caller holds the lock
+        expire_before = time.monotonic() - self.ttl
+        for key in list(self._feeds):
+            results = self._feeds[key]
+            while results and results[0][1] < expire_before:
+                self._bytes -= results.popleft()[2]
+            if not results:
+                del self._feeds[key]
+        while self._bytes > self.max_bytes and self._feeds:
+            key, results = next(iter(self._feeds.items()))
+            self._bytes -= results.popleft()[2]
+            if not results:
+                del self._feeds[key]
+
+    def since(self, cursor: int = 0, feed_key: Any = None) -> Tuple[List[Any], int]:
+        """Results with a sequence number above cursor, oldest first, and the new cursor."""
+        with self._lock:
+            self._evict()
+            if feed_key is not None:
+                if feed_key not in self._feeds:
+                    return [], max(cursor, 0)
+                self._feeds.move_to_end(feed_key)
+                entries = [e for e in self._feeds[feed_key] if e[0] > cursor]
+            else:
+                entries = [e for results in self._feeds.values() for e in results if e[0] > cursor]
+                entries.sort(key=lambda e: e[0])
+            next_cursor = entries[-1][0] if entries else max(cursor, 0)
+            return [e[3] for e in entries], next_cursor
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "feeds": len(self._feeds),
+                "results": sum(len(results) for results in self._feeds.values()),
+                "bytes": self._bytes,
+                "cursor": self._seq,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._feeds.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(results) for results in self._feeds.values())
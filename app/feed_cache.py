@@ -0,0 +1,64 @@
+import hashlib
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, update
+from database import SessionLocal
+from models.news_enrty import NewsEntry
+from fetcher import FetchResult
+
+# Conditional GET support: validators and a body hash are kept on each
+# NewsEntry so unchanged feeds are neither downloaded nor parsed again
+
+
+def conditional_headers(news_id: int) -> Dict[str, str]:
+    with SessionLocal() as db:
+        entry = db.get(NewsEntry, news_id)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+
+def check_unchanged(news_id: int, result: FetchResult) -> Tuple[bool, Optional[str]]:
+    """
+    Returns whether the feed is unchanged since the last stored fetch (a 304 or
+    an identical body) and the hash of the new body, and counts the hit or miss.
+    """
+    digest = None
+    with SessionLocal() as db:
+        if result.status_code == 304:
+            unchanged = True
+        else:
+            digest = hashlib.sha256(result.content).hexdigest()
+            stored = db.query(NewsEntry.content_hash).filter(NewsEntry.id == news_id).scalar()
+            unchanged = stored == digest
+        counter = NewsEntry.cache_hits if unchanged else NewsEntry.cache_misses
+        db.execute(
+            update(NewsEntry)
+            .where(NewsEntry.id == news_id)
+            # Rows created before the counters existed hold NULL
+            .values({counter: func.coalesce(counter, 0) + 1})
+        )
+        db.commit()
+    return unchanged, digest
+
+
+def store_validators(news_id: int, result: FetchResult, digest: Optional[str]):
+    # Only called once the body was processed, so a failed parse is retried
+    # A 304 may omit the validators, keep the stored ones in that case
+    values = {}
+    if result.headers.get("etag"):
+        values[NewsEntry.etag] = result.headers["etag"]
+    if result.headers.get("last-modified"):
+        values[NewsEntry.last_modified] = result.headers["last-modified"]
+    if digest:
+        values[NewsEntry.content_hash] = digest
+    if not values:
+        return
+    with SessionLocal() as db:
+        db.execute(update(NewsEntry).where(NewsEntry.id == news_id).values(values))
+        db.commit()
+
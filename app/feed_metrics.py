@@ -0,0 +1,252 @@
+import cProfile
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from sqlalchemy import delete, func, select, update
+from config import FEED_RUN_RETENTION_DAYS, PROFILE_DIR, PROFILE_KEEP
+from database import SessionLocal
+from fetcher import FetchResult
+from models.feed_run import FeedRun
+from models.news_enrty import NewsEntry
+from poll_policy import FAILURES_BEFORE_DEMOTION
+
+logger = logging.getLogger(__name__)
+
+FETCH_STAGES = ("queue", "connect", "wait", "download")
+PROCESS_STAGES = ("parse", "clean", "store")
+STAGES = FETCH_STAGES + PROCESS_STAGES + ("total",)
+# Old runs are deleted at most this often, from the thread recording a run
+PRUNE_EVERY = 3600
+# Longest error message kept per run and per feed
+MAX_ERROR_CHARS = 500
+
+_last_prune = 0.0
+_profile_requests: Set[int] = set()
+_profile_lock = threading.Lock()
+
+
+class FeedRunStats:
+    """Time spent per stage of one feed run, plus what it downloaded and parsed."""
+
+    def __init__(self, result: FetchResult):
+        self.started_at = datetime.utcnow()
+        self.result = result
+        self.seconds: Dict[str, float] = dict(result.timings)
+        self.items = 0
+        self.new_items = 0
+        # Set when parsing or storing the items failed
+        self.error: Optional[str] = None
+
+    @property
+    def failure(self) -> Optional[str]:
+        # Why the run failed, None for a 200 or 304 that was processed
+        if self.result.error or self.error:
+            return (self.result.error or self.error)[:MAX_ERROR_CHARS]
+        if self.result.status_code not in (200, 304):
+            return f"HTTP {self.result.status_code}"
+        return None
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def to_row(self, news_id: int, profile: Optional[str] = None) -> Dict:
+        row = {f"{stage}_ms": self.seconds.get(stage, 0.0) * 1000 for stage in FETCH_STAGES + PROCESS_STAGES}
+        row["total_ms"] = (self.result.elapsed + sum(self.seconds.get(s, 0.0) for s in PROCESS_STAGES)) * 1000
+        row.update(
+            news_entry_id=news_id,
+            started_at=self.started_at,
+            status_code=self.result.status_code,
+            bytes=len(self.result.content),
+            items=self.items,
+            new_items=self.new_items,
+            error=self.failure,
+            attempts=self.result.attempts,
+            profile=profile,
+        )
+        return row
+
+
+def health_values(failure: Optional[str], now: datetime) -> Dict:
+    # news_entry columns after a run; the failure counter is incremented in SQL
+    if failure is None:
+        return {"consecutive_failures": 0, "last_success_at": now}
+    return {
+        "consecutive_failures": func.coalesce(NewsEntry.consecutive_failures, 0) + 1,
+        "last_error": failure,
+        "last_error_at": now,
+    }
+
+
+def record_feed_run(news_id: int, stats: FeedRunStats, profile: Optional[str] = None):
+    # Stores the run and updates the feed's failure history in one
+    # transaction. Metrics must never fail the fetch itself
+    global _last_prune
+    try:
+        with SessionLocal() as db:
+            db.add(FeedRun(**stats.to_row(news_id, profile)))
+            db.execute(update(NewsEntry).where(NewsEntry.id == news_id)
+                       .values(**health_values(stats.failure, stats.started_at)))
+            if time.monotonic() - _last_prune > PRUNE_EVERY:
+                _last_prune = time.monotonic()
+                cutoff = datetime.utcnow() - timedelta(days=FEED_RUN_RETENTION_DAYS)
+                db.execute(delete(FeedRun).where(FeedRun.started_at < cutoff))
+            db.commit()
+    except Exception as e:
+        logger.warning(f"could not record the run of feed {news_id}: {e}")
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    # Nearest rank on the sorted values
+    if not values:
+        return None
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def run_failed(run: FeedRun) -> bool:
+    # Runs recorded before the error column only have their status code
+    return run.error is not None or run.status_code not in (200, 304)
+
+
+def stage_summary(db, feed_id: Optional[int] = None, hours: int = 24) -> List[Dict]:
+    """p50/p95 of every stage per feed over the runs of the last `hours`."""
+    query = select(FeedRun).where(FeedRun.started_at >= datetime.utcnow() - timedelta(hours=hours))
+    if feed_id is not None:
+        query = query.where(FeedRun.news_entry_id == feed_id)
+
+    runs_by_feed: Dict[int, List[FeedRun]] = {}
+    for run in db.scalars(query.order_by(FeedRun.news_entry_id, FeedRun.started_at)):
+        runs_by_feed.setdefault(run.news_entry_id, []).append(run)
+
+    summary = []
+    for news_id, runs in runs_by_feed.items():
+        stages = {}
+        for stage in STAGES:
+            values = sorted(getattr(run, f"{stage}_ms") or 0.0 for run in runs)
+            stages[stage] = {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+        summary.append({
+            "feed_id": news_id,
+            "runs": len(runs),
+            "errors": sum(1 for run in runs if run_failed(run)),
+            "bytes_downloaded": sum(run.bytes or 0 for run in runs),
+            "items_parsed": sum(run.items or 0 for run in runs),
+            "new_items": sum(run.new_items or 0 for run in runs),
+            "last_run": runs[-1].started_at,
+            "last_profile": next((run.profile for run in reversed(runs) if run.profile), None),
+            "stages_ms": stages,
+        })
+    # Slowest feeds first
+    summary.sort(key=lambda feed: feed["stages_ms"]["total"]["p95"] or 0, reverse=True)
+    return summary
+
+
+def unhealthy_feeds(db, hours: int = 24, min_error_rate: float = 0.2,
+                    min_failures: int = FAILURES_BEFORE_DEMOTION) -> List[Dict]:
+    """
+    Feeds whose runs of the last `hours` failed at least `min_error_rate` of
+    the time, or that failed `min_failures` times in a row, with their error
+    rate, latency and failure history. Worst first.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    runs_by_feed: Dict[int, List] = {}
+    query = (select(FeedRun.news_entry_id, FeedRun.status_code, FeedRun.error, FeedRun.total_ms,
+                    FeedRun.attempts)
+             .where(FeedRun.started_at >= since))
+    for run in db.execute(query):
+        runs_by_feed.setdefault(run.news_entry_id, []).append(run)
+    errors_by_feed = {news_id: sum(1 for run in runs if run_failed(run)) for news_id, runs in runs_by_feed.items()}
+    over_rate = [news_id for news_id, errors in errors_by_feed.items()
+                 if errors and errors / len(runs_by_feed[news_id]) >= min_error_rate]
+    failing = select(NewsEntry).where(NewsEntry.id.in_(over_rate) | (NewsEntry.consecutive_failures >= min_failures))
+
+    unhealthy = []
+    for entry in db.scalars(failing):
+        runs = runs_by_feed.get(entry.id, [])
+        errors = errors_by_feed.get(entry.id, 0)
+        # None when the feed has not run within the window
+        error_rate = round(errors / len(runs), 3) if runs else None
+        failures = entry.consecutive_failures or 0
+        latencies = sorted(run.total_ms or 0.0 for run in runs)
+        unhealthy.append({
+            "feed_id": entry.id,
+            "name": entry.name,
+            "url": entry.url,
+            "runs": len(runs),
+            "errors": errors,
+            "error_rate": error_rate,
+            "retries": sum(max((run.attempts or 1) - 1, 0) for run in runs),
+            "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95)},
+            "consecutive_failures": failures,
+            "last_error": entry.last_error,
+            "last_error_at": entry.last_error_at,
+            "last_success_at": entry.last_success_at,
+            "poll_interval": entry.poll_interval,
+            "demoted": failures >= FAILURES_BEFORE_DEMOTION,
+        })
+    unhealthy.sort(key=lambda feed: (feed["consecutive_failures"], feed["error_rate"] or 0), reverse=True)
+    return unhealthy
+
+
+def request_profile(news_id: int):
+    # Profiles the next run of the feed, whoever triggers it
+    with _profile_lock:
+        _profile_requests.add(news_id)
+
+
+def profile_requested(news_id: int) -> bool:
+    with _profile_lock:
+        if news_id in _profile_requests:
+            _profile_requests.discard(news_id)
+            return True
+    return False
+
+
+def _prune_profiles():
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".prof")),
+        key=os.path.getmtime,
+    )
+    for path in files[:-PROFILE_KEEP]:
+        os.remove(path)
+
+
+@contextmanager
+def profiled(name: str, enabled: bool):
+    """
+    Runs the block under cProfile when enabled and dumps the stats to
+    PROFILE_DIR/<name>-<timestamp>.prof. Yields a dict whose "path" is set
+    once the file is written. Read the file with `python -m pstats`.
+    """
+    output = {"path": None}
+    if not enabled:
+        yield output
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield output
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{name}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.prof")
+            profiler.dump_stats(path)
+            _prune_profiles()
+            output["path"] = path
+            logger.info(f"profile written to {path}")
+        except OSError as e:
+            logger.warning(f"could not write the profile of {name}: {e}")
@@ -0,0 +1,145 @@
+import io
+import re
+from typing import Dict, Iterator, List
+from lxml import etree
+
+# Namespaces used by the RSS extensions we read
+CONTENT_NS = "{http://purl.org/rss/1.0/modules/content/}"
+DC_NS = "{http://purl.org/dc/elements/1.1/}"
+MEDIA_NS = "{http://search.yahoo.com/mrss/}"
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+RSS1_NS = "{http://purl.org/rss/1.0/}"
+
+ITEM_TAGS = ("item", RSS1_NS + "item", ATOM_NS + "entry")
+# <ttl> sits in the channel header, before the items
+TTL_PATTERN = re.compile(rb"<ttl>\s*(\d+)\s*</ttl>")
+TTL_SCAN_BYTES = 16 * 1024
+
+
+def _text(elem) -> str:
+    return (elem.text or "") if elem is not None else ""
+
+
+def _empty_row() -> Dict[str, str]:
+    # Same defaults as the news_data.csv rows written before
+    return {
+        "title": "",
+        "link": "",
+        "published_date": "",
+        "creator": "No creator",
+        "category": "No category",
+        "content": "",
+        "description": "",
+        "guid": "",
+        "media": "No thumbnail",
+    }
+
+
+def _rss_item(item) -> Dict[str, str]:
+    row = _empty_row()
+    thumbnail = enclosure = None
+    # One pass over the children, first occurrence of each field wins
+    seen = set()
+    for child in item:
+        tag = child.tag
+        if not isinstance(tag, str) or tag in seen:
+            continue
+        seen.add(tag)
+        if tag == "title" or tag == RSS1_NS + "title":
+            row["title"] = _text(child)
+        elif tag == "link" or tag == RSS1_NS + "link":
+            row["link"] = _text(child)
+        elif tag == "pubDate" or tag == DC_NS + "date":
+            row["published_date"] = row["published_date"] or _text(child)
+        elif tag == "guid":
+            row["guid"] = _text(child)
+        elif tag == CONTENT_NS + "encoded":
+            row["content"] = _text(child)
+        elif tag == "description" or tag == RSS1_NS + "description":
+            row["description"] = _text(child)
+        elif tag == DC_NS + "creator":
+            row["creator"] = _text(child)
+        elif tag == "category":
+            row["category"] = _text(child)
+        elif tag == MEDIA_NS + "thumbnail":
+            thumbnail = child.get("url")
+        elif tag == "enclosure":
+            enclosure = child.get("url")
+    if not row["guid"]:
+        row["guid"] = item.get("{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about") or row["link"]
+    row["media"] = thumbnail or enclosure or row["media"]
+    return row
+
+
+def _atom_entry(entry) -> Dict[str, str]:
+    row = _empty_row()
+    updated = enclosure = thumbnail = None
+    for child in entry:
+        tag = child.tag
+        if tag == ATOM_NS + "title":
+            row["title"] = _text(child)
+        elif tag == ATOM_NS + "link":
+            rel = child.get("rel", "alternate")
+            if rel == "alternate" and not row["link"]:
+                row["link"] = child.get("href", "")
+            elif rel == "enclosure" and enclosure is None:
+                enclosure = child.get("href")
+        elif tag == ATOM_NS + "id":
+            row["guid"] = _text(child)
+        elif tag == ATOM_NS + "published":
+            row["published_date"] = _text(child)
+        elif tag == ATOM_NS + "updated":
+            updated = _text(child)
+        elif tag == ATOM_NS + "author" and row["creator"] == "No creator":
+            row["creator"] = _text(child.find(ATOM_NS + "name")) or row["creator"]
+        elif tag == ATOM_NS + "category" and row["category"] == "No category":
+            row["category"] = child.get("term") or row["category"]
+        elif tag == ATOM_NS + "content":
+            row["content"] = _text(child)
+        elif tag == ATOM_NS + "summary":
+            row["description"] = _text(child)
+        elif tag == MEDIA_NS + "thumbnail" and thumbnail is None:
+            thumbnail = child.get("url")
+    row["published_date"] = row["published_date"] or updated or ""
+    row["guid"] = row["guid"] or row["link"]
+    row["media"] = thumbnail or enclosure or row["media"]
+    return row
+
+
+def iter_feed(content: bytes, limit: int = 0) -> Iterator[Dict[str, str]]:
+    """
+    Streams the items of an RSS 2.0, RSS 1.0 or Atom feed as dicts with the
+    news_data fields. Stops reading after `limit` items when limit > 0.
+    """
+    parser = etree.iterparse(
+        io.BytesIO(content),
+        events=("end",),
+        tag=ITEM_TAGS,
+        recover=True,
+        resolve_entities=False,
+        no_network=True,
+        huge_tree=True,
+    )
+    count = 0
+    for _, elem in parser:
+        if elem.tag == ATOM_NS + "entry":
+            yield _atom_entry(elem)
+        else:
+            yield _rss_item(elem)
+        count += 1
+        # Free the processed item and the siblings before it
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+        if limit and count >= limit:
+            break
+
+
+def parse_feed(content: bytes, limit: int = 0) -> List[Dict[str, str]]:
+    return list(iter_feed(content, limit))
+
+
+def feed_ttl(content: bytes):
+    """The RSS <ttl> of the feed in minutes, or None."""
+    match = TTL_PATTERN.search(content[:TTL_SCAN_BYTES])
+    return int(match.group(1)) if match else None
@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models.feed_result import FeedResult, FeedResultSeq
+
+# The feed_result table: the latest result of each feed, stored after every
+# fetch (by the fetch workers with FETCH_MODE=queue). /fetch_feed reads the
+# one of a feed, /job-result of the queue mode the ones stored after a cursor.
+
+
+def _next_seq(db) -> int:
+    # Takes the counter row's lock until the caller commits, so the results
+    # are committed in seq order and a reader's cursor never passes a result
+    # that is still being stored
+    seq = db.execute(
+        update(FeedResultSeq).where(FeedResultSeq.id == 1)
+        .values(value=FeedResultSeq.value + 1).returning(FeedResultSeq.value)
+    ).scalar()
+    if seq is None:
+        db.add(FeedResultSeq(id=1, value=1))
+        try:
+            db.flush()
+        except IntegrityError:
+            # Created by another process in the meantime
+            db.rollback()
+            return _next_seq(db)
+        seq = 1
+    return seq
+
+
+def store_result(news_id: int, body: bytes) -> int:
+    """Stores body, the encoded result of a fetch, as the feed's latest and returns its seq."""
+    with SessionLocal() as db:
+        seq = _next_seq(db)
+        values = dict(seq=seq, body=body, stored_at=datetime.utcnow())
+        updated = db.execute(
+            update(FeedResult).where(FeedResult.news_entry_id == news_id).values(**values)
+        ).rowcount
+        if not updated:
+            # The counter lock keeps other writers out, the insert cannot race
+            db.add(FeedResult(news_entry_id=news_id, **values))
+        db.commit()
+    return seq
+
+
+def results_since(cursor: int = 0, news_id: Optional[int] = None) -> Tuple[List[bytes], int]:
+    """Results stored after cursor, oldest first, and the new cursor."""
+    query = select(FeedResult.seq, FeedResult.body).where(FeedResult.seq > cursor)
+    if news_id is not None:
+        query = query.where(FeedResult.news_entry_id == news_id)
+    with SessionLocal() as db:
+        rows = db.execute(query.order_by(FeedResult.seq)).all()
+    next_cursor = rows[-1].seq if rows else max(cursor, 0)
+    return [row.body for row in rows], next_cursor
+
+
+def result_seq(news_id: int) -> Optional[int]:
+    with SessionLocal() as db:
+        return db.scalar(select(FeedResult.seq).where(FeedResult.news_entry_id == news_id))
+
+
+def load_result(news_id: int) -> Optional[Tuple[int, bytes]]:
+    # The feed's latest result and its seq, read together
+    with SessionLocal() as db:
+        row = db.execute(select(FeedResult.seq, FeedResult.body).where(FeedResult.news_entry_id == news_id)).first()
+    return (row.seq, row.body) if row else None
+
+
+def delete_result(news_id: int):
+    with SessionLocal() as db:
+        db.execute(delete(FeedResult).where(FeedResult.news_entry_id == news_id))
+        db.commit()
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+import orjson
+from config import SNAPSHOT_MEMORY_BYTES
+from feed_results import delete_result, load_result, result_seq, store_result
+from response_cache import body_etag
+
+
+class Snapshot(NamedTuple):
+    body: bytes
+    etag: str
+    # feed_result seq of the body, a higher one replaces the memory copy
+    seq: int
+
+
+class FeedSnapshots:
+    """
+    Latest result of each feed, encoded to JSON once when a fetch stores it,
+    so reads send the bytes as they are. Every snapshot is stored in the
+    feed_result table, which the fetch worker processes write too; the most
+    recently read ones are also kept in memory, up to max_bytes, as long as
+    their seq is the one stored for the feed.
+    """
+
+    def __init__(self, max_bytes: int = SNAPSHOT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[int, Snapshot]" = OrderedDict()
+        self._bytes = 0
+
+    def put(self, news_id: int, response) -> Snapshot:
+        body = orjson.dumps(response.model_dump())
+        # The seq is handed out in commit order, so of two writers of the
+        # same feed the one that committed last has the higher seq
+        snapshot = Snapshot(body, body_etag(body), store_result(news_id, body))
+        self._remember(news_id, snapshot)
+        return snapshot
+
+    def get(self, news_id: int) -> Optional[Snapshot]:
+        seq = result_seq(news_id)
+        if seq is None:
+            self._forget(news_id)
+            return None
+        with self._lock:
+            snapshot = self._memory.get(news_id)
+            if snapshot is not None and snapshot.seq == seq:
+                self._memory.move_to_end(news_id)
+                return snapshot
+        stored = load_result(news_id)
+        if stored is None:
+            return None
+        seq, body = stored
+        snapshot = Snapshot(body, body_etag(body), seq)
+        self._remember(news_id, snapshot)
+        return snapshot
+
+    def delete(self, news_id: int):
+        self._forget(news_id)
+        delete_result(news_id)
+
+    def _remember(self, news_id: int, snapshot: Snapshot):
+        with self._lock:
+            previous = self._memory.pop(news_id, None)
+            if previous is not None:
+                if previous.seq > snapshot.seq:
+                    # A newer result was remembered in the meantime
+                    self._memory[news_id] = previous
+                    return
+                self._bytes -= len(previous.body)
+            self._memory[news_id] = snapshot
+            self._bytes += len(snapshot.body)
+            # The least recently read go first, they stay readable from the database
+            while self._bytes > self.max_bytes and self._memory:
+                self._bytes -= len(self._memory.popitem(last=False)[1].body)
+
+    def _forget(self, news_id: int):
+        with self._lock:
+            previous = self._memory.pop(news_id, None)
+            if previous is not None:
+                self._bytes -= len(previous.body)
+
+
+feed_snapshots = FeedSnapshots()
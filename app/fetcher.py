@@ -0,0 +1,314 @@
+import asyncio
+import concurrent.futures
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+# Global budget of requests in flight and per-host limit, so one publisher
+# cannot take every connection in the pool
+MAX_CONCURRENCY = 64
+MAX_PER_HOST = 4
+FETCH_TIMEOUT = httpx.Timeout(connect=5.0, read=20.0, write=10.0, pool=30.0)
+USER_AGENT = "newswire/1.0 (+https://github.com/phiro98/newswire)"
+# Transient failures (timeouts, dropped connections, 429 and 5xx) are retried
+# up to FETCH_RETRIES times, waiting RETRY_BACKOFF * 2^n seconds with full
+# jitter. A longer Retry-After is left to the scheduler, which keeps the
+# feed's next poll at least that far away.
+FETCH_RETRIES = 2
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 8.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+TRANSIENT_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+# After BREAKER_FAILURES transient failures in a row a host is skipped for
+# BREAKER_COOLDOWN seconds, doubled each time the probe after it fails
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 60.0
+MAX_BREAKER_COOLDOWN = 30 * 60.0
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int = 0
+    content: bytes = b""
+    headers: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    # Seconds spent per stage of the last attempt: queue (waiting for a
+    # slot), connect (DNS, TCP and TLS, zero on a reused connection), wait
+    # (until the response headers) and download (the body)
+    timings: Dict[str, float] = field(default_factory=dict)
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code == 200
+
+
+class StageTrace:
+    """
+    httpcore trace callback splitting a request into connect, wait and
+    download time. Redirects add up, each hop goes through the callback.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connect = 0.0
+        self._connect_started = None
+        self.headers_at = None
+
+    async def __call__(self, event: str, info: dict):
+        now = time.perf_counter()
+        if event in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            self._connect_started = now
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete",
+                       "connection.connect_tcp.failed", "connection.start_tls.failed"):
+            if self._connect_started is not None:
+                self.connect += now - self._connect_started
+                self._connect_started = None
+        elif event.endswith(".receive_response_headers.complete"):
+            self.headers_at = now
+
+    def timings(self, finished: float) -> Dict[str, float]:
+        headers_at = self.headers_at or finished
+        return {
+            "connect": self.connect,
+            "wait": max(0.0, headers_at - self.started - self.connect),
+            "download": finished - headers_at,
+        }
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def retry_delay(attempt: int, headers: Dict[str, str]) -> Optional[float]:
+    # Seconds before retry number `attempt`, None when the server asks for
+    # more than we are willing to wait
+    delay = random.uniform(0, min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_RETRY_BACKOFF))
+    retry_after = headers.get("retry-after", "").strip()
+    if retry_after.isdigit():
+        if int(retry_after) > MAX_RETRY_BACKOFF:
+            return None
+        delay = max(delay, int(retry_after))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Failure state of one host. Closed, requests go through; open after
+    `threshold` transient failures in a row, requests fail at once until the
+    cooldown is over; then one probe request is let through (half-open) and
+    either closes it or opens it again for twice as long.
+    """
+
+    def __init__(self, threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 max_cooldown: float = MAX_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def state(self, now: float) -> str:
+        if self.probing:
+            return "half-open"
+        return "open" if self.open_until > now else "closed"
+
+    def allow(self, now: float) -> bool:
+        if now < self.open_until:
+            return False
+        if self.open_until:
+            # Cooldown over: this request is the probe, the others keep
+            # failing fast until it is done
+            self.probing = True
+            self.open_until = now + self.cooldown
+        return True
+
+    def record(self, ok: bool, now: float):
+        if ok:
+            self.failures = 0
+            self.open_until = 0.0
+            self.cooldown = self.base_cooldown
+            self.probing = False
+            return
+        self.failures += 1
+        if self.probing:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        if self.probing or self.failures >= self.threshold:
+            self.open_until = now + self.cooldown
+        self.probing = False
+
+
+class FeedFetcher:
+    """
+    Shared asyncio fetch engine. It owns one event loop running in a daemon
+    thread and one pooled httpx client, so sync callers (scheduler threads)
+    and async callers (API routes) reuse the same keep-alive connections.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_per_host: int = MAX_PER_HOST,
+                 timeout: httpx.Timeout = FETCH_TIMEOUT, retries: int = FETCH_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._budget: Optional[asyncio.Semaphore] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._client = httpx.AsyncClient(
+                        timeout=self.timeout,
+                        follow_redirects=True,
+                        headers={"User-Agent": USER_AGENT},
+                        limits=httpx.Limits(max_connections=self.max_concurrency,
+                                            max_keepalive_connections=self.max_concurrency),
+                    )
+                    self._budget = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="feed-fetcher", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        # Only touched from the fetcher loop, so no locking is needed
+        sem = self._host_limits.get(host)
+        if sem is None:
+            sem = self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return sem
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker()
+        return breaker
+
+    async def _attempt(self, url: str, host: str, headers: Optional[Dict[str, str]]) -> Tuple[FetchResult, bool]:
+        # One request; also returns whether its failure is worth a retry
+        started = time.perf_counter()
+        async with self._budget, self._host_limit(host):
+            timings = {"queue": time.perf_counter() - started}
+            trace = StageTrace()
+            try:
+                response = await self._client.get(url, headers=headers, extensions={"trace": trace})
+                finished = time.perf_counter()
+                timings.update(trace.timings(finished))
+                result = FetchResult(
+                    url=url,
+                    status_code=response.status_code,
+                    content=response.content,
+                    headers=dict(response.headers),
+                    timings=timings,
+                )
+                return result, response.status_code in RETRY_STATUSES
+            except httpx.HTTPError as e:
+                timings.update(trace.timings(time.perf_counter()))
+                return FetchResult(url=url, error=f"{type(e).__name__}: {e}", timings=timings), \
+                    isinstance(e, TRANSIENT_ERRORS)
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        started = time.perf_counter()
+        host = host_of(url)
+        breaker = self._breaker(host)
+        attempts = 0
+        result = None
+        while True:
+            if not breaker.allow(time.monotonic()):
+                # Keep the last response when the circuit opened between retries
+                result = result or FetchResult(
+                    url=url, error=f"CircuitOpen: {host} failed {breaker.failures} times in a row, "
+                                   f"retrying in {breaker.open_until - time.monotonic():.0f}s")
+                break
+            result, transient = await self._attempt(url, host, headers)
+            attempts += 1
+            breaker.record(not transient, time.monotonic())
+            delay = retry_delay(attempts, result.headers) if transient and attempts <= self.retries else None
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        result.attempts = attempts
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    async def _host_states(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "host": host,
+                "state": breaker.state(now),
+                "failures": breaker.failures,
+                "retry_in": round(max(breaker.open_until - now, 0.0), 1),
+            }
+            for host, breaker in self._breakers.items()
+            if breaker.failures or breaker.open_until
+        ]
+
+    async def _get_many(self, requests: List[Tuple[str, Optional[Dict[str, str]]]]) -> List[FetchResult]:
+        return await asyncio.gather(*(self._get(url, headers) for url, headers in requests))
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    # Blocking API, for scheduler threads and sync code
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        self._ensure_started()
+        return self.submit(self._get(url, headers)).result()
+
+    def fetch_many(self, requests: Iterable[Tuple[str, Optional[Dict[str, str]]]]) -> List[FetchResult]:
+        self._ensure_started()
+        return self.submit(self._get_many(list(requests))).result()
+
+    def host_states(self) -> List[Dict]:
+        """Circuit breaker state of the hosts with recent failures."""
+        if self._loop is None:
+            return []
+        return self.submit(self._host_states()).result()
+
+    # Awaitable API, for async routes running on another loop
+    async def fetch_async(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        self._ensure_started()
+        return await asyncio.wrap_future(self.submit(self._get(url, headers)))
+
+    async def fetch_many_async(self, requests: Iterable[Tuple[str, Optional[Dict[str, str]]]]) -> List[FetchResult]:
+        self._ensure_started()
+        return await asyncio.wrap_future(self.submit(self._get_many(list(requests))))
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            loop = self._loop
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+            self._loop = self._thread = self._client = self._budget = None
+            self._host_limits = {}
+            self._breakers = {}
+
+
+# Shared instance used by the API routes and the scheduler
+fetcher = FeedFetcher()
@@ -0,0 +1,121 @@
+import html
+import re
+from html.entities import html5
+from itertools import zip_longest
+from typing import Iterable, List
+from bs4 import BeautifulSoup
+
+# Text extraction equivalent to BeautifulSoup(raw, "html.parser").get_text(" ")
+# followed by html.unescape, without building a tree. One regex split removes
+# the markup: comments, <script>/<style> with their content, tags (quoted
+# attribute values may contain ">"), end tags, declarations and processing
+# instructions. CDATA sections are kept as separate strings, like bs4 does.
+_TAG_REST = r"""(?:=\s*+(?:"[^"]*"|'[^']*'|(?!["']))|[^>=])*>"""
+_MARKUP = re.compile(
+    r"<!--.*?--!?>"
+    r"|<!\[CDATA\[(.+?)\]\]>"
+    r"|<(script|style)\b" + _TAG_REST + r".*?(?:</\2\s*>|\Z)"
+    r"|<[a-zA-Z][^\t\n\r\f />\x00]*" + _TAG_REST +
+    r"|</[^>]*>"
+    r"|<!(?!--|\[)[^>]*>"
+    r"|<\?[^>]*>",
+    re.S | re.I,
+)
+
+# Input html.parser recovers from in ways the split does not reproduce:
+# elements whose strings bs4 drops or keeps verbatim, NUL bytes, broken tag
+# names and incomplete character references. Rare in feeds, they go through
+# BeautifulSoup.
+_SPECIAL = re.compile(
+    r"""<(?:template|rt|rp|pre|textarea)\b"""
+    r"""|<[a-zA-Z][^\s/>]*['"=<]"""
+    r"""|&#(?![0-9]|[xX][0-9a-fA-F])|&#[xX]?[0-9a-fA-F]*\Z"""
+    r"""|\x00""",
+    re.I,
+)
+# Markup left in the text means a construct the split did not close
+_RESIDUE = re.compile(r"<[a-zA-Z/!?]")
+
+_CHARREF = re.compile(r"&(#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[^\t\n\f <&#;]{1,32};?)")
+# Code points html.unescape drops but bs4 keeps
+_KEPT_CODEPOINTS = frozenset(
+    [*range(0x1, 0x9), 0xB, *range(0xE, 0x20), 0x7F, *range(0xFDD0, 0xFDF0)]
+    + [plane * 0x10000 + low for plane in range(17) for low in (0xFFFE, 0xFFFF)]
+)
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_MAX_CACHED_REFS = 4096
+_decoded_refs = {}
+
+
+class _NeedsSoup(Exception):
+    pass
+
+
+def _decode_ref(match) -> str:
+    ref = match.group(1)
+    if ref[0] == "#":
+        number = int(ref[2:].rstrip(";"), 16) if ref[1] in "xX" else int(ref[1:].rstrip(";"))
+        if number in _KEPT_CODEPOINTS:
+            return chr(number)
+    elif ref[-1] == ";" and ref not in html5:
+        # bs4 drops the ";" of unknown entities
+        raise _NeedsSoup
+    return html.unescape(match.group(0))
+
+
+def _decode_cached(match) -> str:
+    ref = match.group(0)
+    decoded = _decoded_refs.get(ref)
+    if decoded is None:
+        decoded = _decode_ref(match)
+        if len(_decoded_refs) < _MAX_CACHED_REFS:
+            _decoded_refs[ref] = decoded
+    return decoded
+
+
+def soup_to_text(raw_html: str) -> str:
+    """The BeautifulSoup implementation, the reference for html_to_text."""
+    if not raw_html:
+        return ""
+    soup = BeautifulSoup(raw_html, "html.parser")
+    plain_text = soup.get_text(separator=' ')  # ensures text separated by space
+    decoded = html.unescape(plain_text)        # decode HTML entities like &amp;, &#8217;, etc.
+    return decoded.replace('\n', ' ').replace('\r', '').strip()
+
+
+def html_to_text(raw_html: str) -> str:
+    """
+    Removes HTML tags, decodes HTML entities, and strips whitespace/newlines.
+    Same output as soup_to_text, about ten times faster.
+    """
+    if not raw_html:
+        return ""
+    if _SPECIAL.search(raw_html):
+        return soup_to_text(raw_html)
+
+    tokens = _MARKUP.split(raw_html)
+    parts = []
+    try:
+        # The split yields text, CDATA content, script/style name, text, ...
+        for text, cdata in zip_longest(tokens[0::3], tokens[1::3]):
+            if text:
+                # Entities are decoded per string, as the parser does
+                if "&" in text:
+                    text = _CHARREF.sub(_decode_cached, text)
+                # bs4 collapses whitespace-only strings to one character
+                if not text.strip(_ASCII_SPACES):
+                    text = "\n" if "\n" in text else " "
+                parts.append(text)
+            if cdata is not None:
+                parts.append(cdata)
+    except _NeedsSoup:
+        return soup_to_text(raw_html)
+
+    plain_text = " ".join(parts)
+    if _RESIDUE.search(plain_text):
+        return soup_to_text(raw_html)
+    return html.unescape(plain_text).replace('\n', ' ').replace('\r', '').strip()
+
+
+def html_to_text_many(values: Iterable[str]) -> List[str]:
+    return [html_to_text(value) for value in values]
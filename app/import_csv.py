@@ -0,0 +1,31 @@
+"""
+One-time import of the legacy append-only news_data.csv into the article
+table. Duplicate rows are dropped by the same guid/link key fetch_rss uses.
+
+    python import_csv.py [news_data.csv]
+"""
+import csv
+import sys
+from article_store import store_articles
+
+BATCH_SIZE = 1000
+
+
+def import_csv(path: str = "news_data.csv") -> int:
+    csv.field_size_limit(sys.maxsize)
+    inserted = 0
+    batch = []
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                inserted += len(store_articles(None, batch))
+                batch = []
+    if batch:
+        inserted += len(store_articles(None, batch))
+    return inserted
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "news_data.csv"
+    print(f"imported {import_csv(path)} new articles from {path}")
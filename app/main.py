@@ -1,15 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends 
-from ml_route import compare_and_cluster_articles
+from fastapi import FastAPI, HTTPException, Depends, Request
 from sqlalchemy.orm import sessionmaker
 from fastapi.middleware.cors import CORSMiddleware
-from scheduler import scheduler, create_task
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from metrics import MetricsMiddleware, registry
+from scheduler import create_task, remove_task, start_scheduling, list_tasks
+from fetcher import fetcher
+from db_writer import article_writer
+from ml_jobs import cluster_jobs
 from sqlalchemy.orm import Session
 import os
-from utils import fetch_rss, SCHED_FEED, log_request_response, clear_sched_feed, logger
+import json
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+from utils import fetch_rss_async, fetch_rss_as_completed, SCHED_FEED, log_request_response, clear_sched_feed, logger
 from schemas.news_request import NewsEntrySchema, NewsEntryUpdate
+from schemas.news_response import NewsResponse
+from bulk_feeds import MAX_BATCH, create_entries, parse_opml, schedule_entries
 from sqlalchemy import create_engine
 from database import SessionLocal, get_db
 from models.news_enrty import NewsEntry
+from article_store import recent_articles
+from article_events import article_stream
+from search import MAX_SEARCH_LIMIT, SearchQueryError, search_articles, search_enabled
+from feed_metrics import stage_summary, unhealthy_feeds, request_profile
+from response_cache import response_cache, cached_json_response, etag_response, body_etag
+from feed_results import results_since
+from feed_snapshots import feed_snapshots
+from config import FETCH_MODE
 from sqlalchemy import create_engine, Column, Integer, String, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -28,8 +47,24 @@ app.add_middleware(
 
 
 
-# Initialize scheduler
-scheduler.start()
+# Per-route latency, status and payload size, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+# Initialize scheduler, jobs are loaded from the database job store. With
+# FETCH_MODE=queue the feeds are only enqueued, worker.py processes fetch them
+start_scheduling()
+
+# Close the pooled HTTP connections, the article writer and the ML worker
+# processes on shutdown
+@app.on_event("shutdown")
+def close_workers():
+    fetcher.close()
+    article_writer.close()
+    cluster_jobs.shutdown()
 
 # Route to add rssfeed
 @app.post("/news_entry")
@@ -50,33 +85,253 @@ def create_news_entry(news_entry: NewsEntrySchema, db: SessionLocal = Depends(ge
         db.add(entry)
         db.commit()
         db.refresh(entry)
+        response_cache.invalidate("news_entry")
         
-        return {"message": "News entry created","task_id": entry.id, "data": entry}
+        return {"message": "News entry created","task_id": entry.id, "data": entry_columns(entry)}
     except Exception as e:
             raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+# Create many entries in one transaction, from a JSON array
+@app.post("/news_entries")
+@log_request_response
+def create_news_entries(news_entries: List[NewsEntrySchema], db: SessionLocal = Depends(get_db)):
+    if len(news_entries) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} entries per request")
+    try:
+        created, skipped = create_entries(db, news_entries)
+        response_cache.invalidate("news_entry")
+        return {"message": f"{len(created)} news entries created", "data": created, "skipped": skipped}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Same from an OPML subscription list sent as the request body, the fields
+# OPML does not carry come from the query
+@app.post("/news_entries/opml")
+@log_request_response
+async def import_opml(request: Request, news_count: int = 10, auto_dialer: bool = False,
+                      delay: Optional[int] = None, author: Optional[str] = None):
+    try:
+        news_entries = parse_opml(await request.body(), news_count, auto_dialer, delay, author)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid OPML: {str(e)}")
+    if len(news_entries) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} entries per request")
+
+    def create():
+        with SessionLocal() as db:
+            return create_entries(db, news_entries)
+
+    try:
+        created, skipped = await asyncio.to_thread(create)
+        response_cache.invalidate("news_entry")
+        return {"message": f"{len(created)} news entries created", "data": created, "skipped": skipped}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Serves the latest stored result of the feed; fresh=true (or profile=true)
+# fetches it live, as does the first read of a feed never fetched before
 @app.get("/fetch_feed/{news_id}")
 @log_request_response
-def fetch_feed(news_id: int, db: SessionLocal = Depends(get_db)):
+async def fetch_feed(request: Request, news_id: int, fresh: bool = False, profile: bool = False,
+                     db: SessionLocal = Depends(get_db)):
     try:
+        if not fresh and not profile:
+            snapshot = await asyncio.to_thread(feed_snapshots.get, news_id)
+            if snapshot is not None:
+                return etag_response(request, snapshot.etag, b'{"data":' + snapshot.body + b"}")
         task = db.query(NewsEntry).filter(NewsEntry.id == news_id).first()
-        feeds = fetch_rss(task)
+        feeds = await fetch_rss_async(task, profile=profile)
         return {"data":feeds}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+# Fetch many entries concurrently, body: [news_id, ...]. The response is
+# NDJSON, one line per feed as soon as it is done; items=true adds the items
+@app.post("/fetch_feeds")
+@log_request_response
+async def fetch_feeds(news_ids: List[int], items: bool = False):
+    if len(news_ids) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} ids per request")
+
+    def load():
+        with SessionLocal() as db:
+            return db.query(NewsEntry).filter(NewsEntry.id.in_(news_ids)).all()
+
+    try:
+        entries = await asyncio.to_thread(load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    missing = set(news_ids) - {entry.id for entry in entries}
+
+    async def lines():
+        for news_id in missing:
+            yield json.dumps({"id": news_id, "error": "News entry not found"}) + "\n"
+        async for entry, result, response in fetch_rss_as_completed(entries):
+            line = {"id": entry.id, "name": entry.name, "status_code": result.status_code, "error": result.error}
+            if isinstance(response, NewsResponse):
+                line.update(not_modified=response.not_modified, new_articles=response.new_articles,
+                            items=len(response.news))
+                if items:
+                    line["news"] = response.news
+            elif isinstance(response, Exception):
+                line["error"] = f"Failed to process the feed: {response}"
+            else:
+                line["error"] = line["error"] or f"HTTP {result.status_code}"
+            yield json.dumps(jsonable_encoder(line)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Fields of the entry listing; the fetch state columns change on every poll
+# and are served by /cache-stats instead
+ENTRY_LIST_FIELDS = ("id", "name", "url", "news_count", "auto_dialer", "author", "categories", "tags", "delay", "scheduled")
+MAX_PAGE_SIZE = 500
+
+
+# Every column of an entry, read while its session is open: the response is
+# encoded after get_db has closed the session and detached the instance
+def entry_columns(entry: NewsEntry) -> Dict:
+    return {column.name: getattr(entry, column.name) for column in NewsEntry.__table__.columns}
+
+
 @app.get("/fetch_all_entry/")
 @log_request_response
-def fetch_feed(db: SessionLocal = Depends(get_db)):
+def fetch_all_entries(request: Request, limit: int = 100, after_id: int = 0):
+    # Keyset pagination on id: pass next_cursor back as after_id
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    def build():
+        with SessionLocal() as db:
+            news_data = (
+                db.query(NewsEntry)
+                .filter(NewsEntry.id > after_id)
+                .order_by(NewsEntry.id)
+                .limit(limit)
+                .all()
+            )
+            newslist = [{field: getattr(news, field) for field in ENTRY_LIST_FIELDS} for news in news_data]
+        next_cursor = newslist[-1]["id"] if len(newslist) == limit else None
+        return {"data": newslist, "next_cursor": next_cursor}, {}
+
+    try:
+        return cached_json_response(request, response_cache, "news_entry", (limit, after_id), build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Conditional GET hit/miss counters per news entry
+@app.get("/cache-stats")
+@log_request_response
+def get_cache_stats(db: SessionLocal = Depends(get_db)):
     try:
-        news_data = db.query(NewsEntry).all()
-        newslist = [news for news in news_data]
-        return {"data":newslist}
+        entries = db.query(NewsEntry).all()
+        stats = [
+            {
+                "id": entry.id,
+                "name": entry.name,
+                "hits": entry.cache_hits or 0,
+                "misses": entry.cache_misses or 0,
+                "etag": entry.etag,
+                "last_modified": entry.last_modified,
+            }
+            for entry in entries
+        ]
+        return {"data": stats}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+# p50/p95 time per fetch stage of each feed, slowest feeds first
+@app.get("/feed-stats")
+@log_request_response
+def get_feed_stats(feed_id: Optional[int] = None, hours: int = 24, db: SessionLocal = Depends(get_db)):
+    try:
+        stats = stage_summary(db, feed_id, hours)
+        names = dict(db.query(NewsEntry.id, NewsEntry.name).filter(NewsEntry.id.in_([s["feed_id"] for s in stats])).all())
+        for feed in stats:
+            feed["name"] = names.get(feed["feed_id"])
+        return {"data": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Feeds failing often or several runs in a row, with their error rate,
+# latency and last error, plus the hosts whose circuit breaker tripped
+@app.get("/feed-stats/unhealthy")
+@log_request_response
+def get_unhealthy_feeds(hours: int = 24, min_error_rate: float = 0.2, db: SessionLocal = Depends(get_db)):
+    try:
+        return {"data": unhealthy_feeds(db, hours, min_error_rate), "hosts": fetcher.host_states()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Profile the next run of a feed, scheduled or not
+@app.post("/feed-stats/{news_id}/profile")
+@log_request_response
+def profile_feed(news_id: int, db: SessionLocal = Depends(get_db)):
+    if not db.query(NewsEntry.id).filter(NewsEntry.id == news_id).first():
+        raise HTTPException(status_code=404, detail="Task not found")
+    request_profile(news_id)
+    return {"message": f"next run of feed {news_id} will be profiled"}
+
+# Stored articles in insert order; pass since_id to get only the new ones
+@app.get("/articles")
+@log_request_response
+def get_articles(feed_id: Optional[int] = None, since_id: int = 0, limit: int = 100, story_id: Optional[int] = None,
+                 db: SessionLocal = Depends(get_db)):
+    try:
+        articles = recent_articles(db, feed_id=feed_id, since_id=since_id, limit=min(limit, 1000), story_id=story_id)
+        next_id = articles[-1]["id"] if articles else since_id
+        return {"data": articles, "next_since_id": next_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Full-text search of the stored articles, best match first (or newest
+# first with sort=newest). Pass the returned next_cursor as cursor for the
+# next page.
+@app.get("/search")
+@log_request_response
+def search(q: str, raw: bool = False, feed_id: Optional[int] = None, tag: Optional[str] = None,
+           category: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+           sort: str = "rank", cursor: Optional[str] = None, limit: int = 20, db: SessionLocal = Depends(get_db)):
+    if not search_enabled:
+        raise HTTPException(status_code=501, detail="Search needs an SQLite database with FTS5")
+    try:
+        results, next_cursor = search_articles(db, q, raw=raw, feed_id=feed_id, tag=tag, category=category,
+                                               since=since, until=until, sort=sort, cursor=cursor,
+                                               limit=max(1, min(limit, MAX_SEARCH_LIMIT)))
+        return {"data": results, "next_cursor": next_cursor}
+    except SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# Push channel for new articles. Server-Sent Events by default (the event id
+# is the article id, so EventSource resumes with Last-Event-ID), or NDJSON
+# with format=ndjson. Heartbeats are SSE comments / empty NDJSON lines.
+@app.get("/articles/stream")
+async def stream_articles(request: Request, feed_id: Optional[int] = None, category: Optional[str] = None,
+                          tag: Optional[str] = None, format: str = "sse", content: bool = False,
+                          last_event_id: Optional[int] = None):
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be sse or ndjson")
+    header_id = request.headers.get("last-event-id")
+    if header_id is not None:
+        if not header_id.isdigit():
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an article id")
+        last_event_id = int(header_id)
+
+    async def events():
+        async for rows in article_stream(last_event_id, feed_id, category, tag, content):
+            if format == "ndjson":
+                yield "".join(json.dumps(jsonable_encoder(row)) + "\n" for row in rows) if rows else "\n"
+            elif rows:
+                yield "".join(f"id: {row['id']}\nevent: article\ndata: {json.dumps(jsonable_encoder(row))}\n\n" for row in rows)
+            else:
+                yield ": keep-alive\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Route to schedule a task by task id
 @app.post("/schedule_task/{task_id}")
 @log_request_response
@@ -93,18 +348,33 @@ def schedule_task(news_id: int, db: SessionLocal = Depends(get_db)):
     try:
         if task.auto_dialer:
             task_id = create_task(task)   #task.url, task.delay, task.news_count)
+            task.scheduled = True
+            task.poll_interval = None
+            db.commit()
+            response_cache.invalidate("news_entry")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
     return {"message": "Task scheduled successfully", "task_id": task_id}
 
+# Schedule many entries at once, body: [news_id, ...]
+@app.post("/schedule_tasks")
+@log_request_response
+def schedule_tasks(news_ids: List[int], db: SessionLocal = Depends(get_db)):
+    if len(news_ids) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} ids per request")
+    try:
+        job_ids, skipped = schedule_entries(db, news_ids)
+        response_cache.invalidate("news_entry")
+        return {"message": f"{len(job_ids)} tasks scheduled", "task_ids": job_ids, "skipped": skipped}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
 @app.get("/tasks")
 @log_request_response
 def get_tasks():
     try:
-        jobs = scheduler.get_jobs()
-        task_list = [{"task_id": job.id, "next_run_time": job.next_run_time} for job in jobs]
-        return {"tasks": task_list}
+        return {"tasks": list_tasks()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
@@ -114,12 +384,22 @@ if not os.path.exists("data"):
 
 @app.get("/job-result")
 @log_request_response
-def get_job_result():
-    global SCHED_FEED
-    try:    
-        if SCHED_FEED:
-            return SCHED_FEED  # Return the latest job output
-        return ["Job has not run yet"]
+def get_job_result(request: Request, cursor: int = 0, feed_id: Optional[int] = None):
+    try:
+        # Only the results stored after `cursor`; pass back the returned cursor.
+        # They are sent as they were encoded after the fetch
+        if FETCH_MODE == "queue":
+            # The latest result of each feed, stored by the fetch workers
+            results, next_cursor = results_since(cursor, feed_id)
+            stored = next_cursor
+        else:
+            snapshots, next_cursor = SCHED_FEED.since(cursor, feed_id)
+            results = [snapshot.body for snapshot in snapshots]
+            stored = SCHED_FEED.stats()["cursor"]
+        if not (results or cursor or stored):
+            return {"data": ["Job has not run yet"], "cursor": next_cursor}
+        body = b'{"data":[' + b",".join(results) + b'],"cursor":%d}' % next_cursor
+        return etag_response(request, body_etag(body), body)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
     
@@ -162,8 +442,19 @@ async def update_news_entry(news_id: int, update_data: NewsEntryUpdate, db: Sess
         db.add(news_entry)
         db.commit()
         db.refresh(news_entry)
+        response_cache.invalidate("news_entry")
+
+        # Keep the scheduled job in line with the new delay / auto_dialer
+        if news_entry.scheduled and ("delay" in update_dict or "auto_dialer" in update_dict):
+            if news_entry.auto_dialer and news_entry.delay and news_entry.delay > 0:
+                # A new delay restarts the adaptive interval from it
+                news_entry.poll_interval = None
+                db.commit()
+                create_task(news_entry)
+            else:
+                remove_task(news_id)
 
-        return news_entry
+        return entry_columns(news_entry)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
@@ -176,15 +467,45 @@ def delete_news_entry(news_id: int, db: Session = Depends(get_db)):
         if not news_entry:
             raise HTTPException(status_code=404, detail="News entry not found")
         
-        # Delete the news entry
+        # Delete the news entry and its scheduled job
         db.delete(news_entry)
         db.commit()
+        response_cache.invalidate("news_entry")
+        remove_task(news_id)
+        feed_snapshots.delete(news_id)
 
         return {"message": f"News entry with id {news_id} has been deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+# Clustering runs as a background job in a process pool, so the ML stack is
+# only loaded there and the event loop is never blocked
 @app.post("/compare-cluster")
-async def compare_cluster_endpoint():
-    return await compare_and_cluster_articles()
\ No newline at end of file
+def compare_cluster_endpoint(incremental: bool = True, render: bool = False):
+    # incremental=false rebuilds TF-IDF and KMeans over every article,
+    # render=true also saves the heatmap and PCA images (full mode only)
+    try:
+        return cluster_jobs.submit(incremental=incremental, render=render)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@app.get("/compare-cluster/{job_id}")
+def compare_cluster_status(job_id: str):
+    job = cluster_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/compare-cluster/{job_id}/result")
+def compare_cluster_result(job_id: str):
+    job = cluster_jobs.result(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "done":
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"]})
+    return job["result"]
@@ -0,0 +1,114 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from sqlalchemy import func, select
+from database import SessionLocal
+from models.article import Article
+
+# One worker: the incremental model is a single file updated in place
+ML_WORKERS = 1
+MAX_JOBS = 100
+
+
+def run_cluster_job(incremental: bool, render: bool) -> Dict[str, Any]:
+    # Runs in the pool process, so only it pays for the ML imports
+    import ml_route
+    if incremental:
+        return ml_route.cluster_articles_incremental()
+    return ml_route.compare_and_cluster_articles(render=render)
+
+
+def article_set_key() -> tuple:
+    # Articles are only ever inserted, so the count and the last id identify the set
+    with SessionLocal() as db:
+        count, last_id = db.execute(select(func.count(Article.id), func.max(Article.id))).one()
+    return count, last_id
+
+
+class ClusterJobQueue:
+    """
+    Runs /compare-cluster computations in a process pool, off the API event
+    loop. Results are kept per job id, and a finished job is reused while the
+    stored article set has not changed.
+    """
+
+    def __init__(self, workers: int = ML_WORKERS, max_jobs: int = MAX_JOBS):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_key: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking the API process would copy its scheduler and fetcher threads
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submit(self, incremental: bool = True, render: bool = False) -> Dict[str, Any]:
+        key = (incremental, render) + article_set_key()
+        with self._lock:
+            job_id = self._by_key.get(key)
+            if job_id in self._jobs and self._jobs[job_id]["status"] != "failed":
+                return self.status(job_id)
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "status": "pending",
+                "incremental": incremental,
+                "render": render,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "error": None,
+                "result": None,
+            }
+            self._jobs[job_id] = job
+            self._by_key[key] = job_id
+            self._trim()
+            future = self._pool().submit(run_cluster_job, incremental, render)
+            job["status"] = "running"
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return self.status(job_id)
+
+    def _finish(self, job_id: str, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["finished_at"] = time.time()
+            try:
+                job["result"] = future.result()
+                job["status"] = "done"
+            except Exception as e:
+                job["error"] = f"{type(e).__name__}: {e}"
+                job["status"] = "failed"
+
+    def _trim(self):
+        # Caller holds the lock
+        while len(self._jobs) > self.max_jobs:
+            old_id, _ = self._jobs.popitem(last=False)
+            self._by_key = {k: v for k, v in self._by_key.items() if v != old_id}
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "result"}
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+cluster_jobs = ClusterJobQueue()
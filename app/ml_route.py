@@ -2,47 +2,29 @@ from schemas.news_response import NewsResponse as NewsItem
 from fastapi import FastAPI
 from pydantic import BaseModel
 from typing import List
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import KMeans
-import spacy
-import pandas as pd
+from sqlalchemy import select
+from database import SessionLocal
+from models.article import Article
+from preprocess import preprocess_articles
+from cluster_model import IncrementalClusterModel, model_lock
+from corpus import sync_corpus, tfidf
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.decomposition import PCA
-import matplotlib.pyplot as plt
 
 
-# Load spaCy model for preprocessing
-nlp = spacy.load("en_core_web_sm")
-
-# Preprocessing function
-def preprocess_text(text: str) -> str:
-    doc = nlp(text.lower())
-    processed_text = " ".join([token.lemma_ for token in doc if not token.is_stop and not token.is_punct])
-    return processed_text
-
 # Route to compare articles and cluster them
-async def compare_and_cluster_articles():
-    # Read CSV and extract 'content' column
-    df = pd.read_csv("news_data.csv")
-    if 'content' not in df.columns:
-        raise ValueError("CSV must contain a 'content' column")
-
-    texts = df['content'].dropna().tolist()
-
-    # Preprocess texts
-    processed_texts = [preprocess_text(text) for text in texts]
+# Plain blocking function, run by the ml_jobs process pool
+def compare_and_cluster_articles(render: bool = False):
+    # Append the articles stored since the last run to the on-disk corpus,
+    # then map its term counts instead of vectorizing every text again
+    with SessionLocal() as db:
+        corpus = sync_corpus(db)
+    _, counts = corpus.counts()
 
     # TF-IDF Vectorization
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(processed_texts)
+    tfidf_matrix = tfidf(counts)
 
-    # Get the feature names (i.e., words in the vocabulary)
-    feature_names = vectorizer.get_feature_names_out()
-    print(feature_names)
-    print(tfidf_matrix.toarray())
     # Cosine Similarity
     similarity_matrix = cosine_similarity(tfidf_matrix)
 
@@ -51,6 +33,24 @@ async def compare_and_cluster_articles():
     num_clusters = 3  # For now, we use 3 clusters; adjust based on need
     kmeans = KMeans(n_clusters=num_clusters)
     clusters = kmeans.fit_predict(tfidf_matrix)
+
+    # Heatmap and PCA images are opt-in, they dominate the run time
+    if render:
+        render_plots(similarity_matrix, tfidf_matrix, clusters)
+
+    return {
+        "similarity_matrix": similarity_matrix.tolist(),
+        "clusters": clusters.tolist()
+    }
+
+
+def render_plots(similarity_matrix, tfidf_matrix, clusters):
+    import matplotlib
+    matplotlib.use("Agg")  # no display in the worker process
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.decomposition import PCA
+
     # Make sure the directory exists
     os.makedirs('static', exist_ok=True)
 
@@ -67,10 +67,34 @@ async def compare_and_cluster_articles():
     plt.scatter(reduced[:, 0], reduced[:, 1], c=clusters, cmap='viridis')
     plt.title("Cluster Visualization (PCA)")
     plt.savefig("static/article_clusters.png")
+    plt.close("all")
 
 
+# Incremental clustering: only the articles stored since the last run are
+# preprocessed and fitted, the model is persisted between requests
+def cluster_articles_incremental():
+    with model_lock:
+        model = IncrementalClusterModel.load()
+        with SessionLocal() as db:
+            rows = list(db.scalars(
+                select(Article)
+                .where(Article.id > model.last_article_id, Article.content != "")
+                .order_by(Article.id)
+            ))
+            processed = preprocess_articles(db, rows)
+        if rows:
+            model.partial_fit([row.id for row in rows], [processed[row.id] for row in rows])
+            model.save()
+        clusters = model.clusters()
+
     return {
-        "similarity_matrix": similarity_matrix.tolist(),
-        "clusters": clusters.tolist()
+        "new_articles": len(rows),
+        "articles": [
+            {
+                "article_id": article_id,
+                "cluster": clusters.get(article_id),
+                "neighbors": model.top_neighbors(article_id),
+            }
+            for article_id in model.article_ids
+        ],
     }
-
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, LargeBinary, Index
+from sqlalchemy.orm import deferred
+from database import engine, add_missing_columns
+from models.news_enrty import Base
+
+class Article(Base):
+    __tablename__ = "article"
+
+    id = Column(Integer, primary_key=True)
+    # sha1 of the guid (or link when there is no guid), used for dedup
+    uid = Column(String(40), unique=True, nullable=False)
+    news_entry_id = Column(Integer, nullable=True)
+    title = Column(String)
+    link = Column(String)
+    guid = Column(String)
+    published_date = Column(String)
+    published_at = Column(DateTime, nullable=True)
+    creator = Column(String)
+    category = Column(String)
+    content = Column(Text)
+    description = Column(Text)
+    media = Column(String)
+    fetched_at = Column(DateTime)
+    # Lemmatized content for the ML path, with the hash of the content it came from
+    processed_text = Column(Text, nullable=True)
+    processed_hash = Column(String(40), nullable=True)
+    # MinHash of title + description and the story (first article) it was
+    # matched to at ingest, see near_dup.py. The signature is only loaded on
+    # demand so it stays out of the API responses.
+    minhash = deferred(Column(LargeBinary, nullable=True))
+    story_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_article_feed_published", "news_entry_id", "published_at"),
+        Index("ix_article_published_at", "published_at"),
+        Index("ix_article_story_id", "story_id"),
+    )
+
+class ArticleBand(Base):
+    __tablename__ = "article_band"
+
+    # LSH index of the article signatures: one row per band of each article
+    key = Column(BigInteger, primary_key=True, autoincrement=False)
+    article_id = Column(Integer, primary_key=True, autoincrement=False)
+    story_id = Column(Integer, nullable=False)
+
+# Create the database tables
+Base.metadata.create_all(bind=engine)
+add_missing_columns(Article.__table__)
+# Indexes of columns added to an existing table
+for index in Article.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from database import engine
+from models.news_enrty import Base
+
+class FeedQueueItem(Base):
+    __tablename__ = "feed_queue"
+
+    # One row per scheduled feed in FETCH_MODE=queue, due at due_at. The
+    # worker that claims it holds a lease until lease_until and extends it
+    # with heartbeats while the fetch runs; once the lease expires another
+    # worker may take the feed over
+    news_entry_id = Column(Integer, primary_key=True)
+    due_at = Column(DateTime, nullable=False)
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_feed_queue_due_at", "due_at"),)
+
+# Create the database tables
+Base.metadata.create_all(bind=engine)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, BigInteger, LargeBinary, DateTime, Index
+from database import engine
+from models.news_enrty import Base
+
+class FeedResult(Base):
+    __tablename__ = "feed_result"
+
+    # Latest fetch result of each feed as encoded JSON, written by whichever
+    # process fetched it and read by the API. seq grows in commit order across
+    # processes: it is the /job-result cursor and the version of a snapshot
+    news_entry_id = Column(Integer, primary_key=True)
+    seq = Column(BigInteger, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    stored_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index("ix_feed_result_seq", "seq"),)
+
+class FeedResultSeq(Base):
+    __tablename__ = "feed_result_seq"
+
+    # A single row holding the last seq handed out
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False)
+
+# Create the database tables
+Base.metadata.create_all(bind=engine)
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, Index
+from database import engine, add_missing_columns
+from models.news_enrty import Base
+
+class FeedRun(Base):
+    __tablename__ = "feed_run"
+
+    # One row per fetch of a feed, with the time spent in each stage (ms)
+    id = Column(Integer, primary_key=True)
+    news_entry_id = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    status_code = Column(Integer)
+    bytes = Column(Integer, default=0)
+    items = Column(Integer, default=0)
+    new_items = Column(Integer, default=0)
+    queue_ms = Column(Float)
+    connect_ms = Column(Float)
+    wait_ms = Column(Float)
+    download_ms = Column(Float)
+    parse_ms = Column(Float)
+    clean_ms = Column(Float)
+    store_ms = Column(Float)
+    total_ms = Column(Float)
+    # Why the run failed (fetch, HTTP status or processing error), and the
+    # requests it took including retries
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=1)
+    # cProfile dump of the run, when profiling was requested
+    profile = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_feed_run_feed_started", "news_entry_id", "started_at"),
+        Index("ix_feed_run_started_at", "started_at"),
+    )
+
+# Create the database tables
+Base.metadata.create_all(bind=engine)
+add_missing_columns(FeedRun.__table__)
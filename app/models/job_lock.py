@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime
+from database import engine
+from models.news_enrty import Base
+
+class JobLock(Base):
+    __tablename__ = "job_lock"
+
+    # One row per scheduled job, leased by the process running it
+    job_id = Column(String, primary_key=True)
+    owner = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+
+# Create the database tables
+Base.metadata.create_all(bind=engine)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from database import engine
+from database import engine, add_missing_columns
 Base = declarative_base()
 
 class NewsEntry(Base):
@@ -15,6 +15,24 @@ class NewsEntry(Base):
     categories = Column(String, nullable=True)
     tags = Column(String, nullable=True)
     delay = Column(Integer, nullable=True, default=1)
+    # Set once the entry has a scheduled fetch job
+    scheduled = Column(Boolean, default=False)
+    # Adaptive poll interval in minutes and the publisher's <ttl> hint
+    poll_interval = Column(Integer, nullable=True)
+    ttl = Column(Integer, nullable=True)
+    # Conditional GET state of the last successful fetch
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)
+    cache_hits = Column(Integer, default=0)
+    cache_misses = Column(Integer, default=0)
+    # Failure history: failed runs in a row (reset by a successful one), the
+    # last error and when the feed last failed / succeeded
+    consecutive_failures = Column(Integer, default=0)
+    last_error = Column(String, nullable=True)
+    last_error_at = Column(DateTime, nullable=True)
+    last_success_at = Column(DateTime, nullable=True)
 
 # Create the database tables
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
+add_missing_columns(NewsEntry.__table__)
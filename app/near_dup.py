@@ -0,0 +1,179 @@
+import hashlib
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from sqlalchemy import insert, select, update
+from models.article import Article, ArticleBand
+
+# MinHash with NUM_PERM permutations, split into BANDS bands of ROWS values
+# for the LSH index. Two articles become candidates when one band matches:
+# probability 1 - (1 - J^ROWS)^BANDS for Jaccard similarity J, 0.87 at
+# J = 0.5 and 0.99 at J = 0.65.
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+# Estimated Jaccard similarity of the word shingles above which a candidate
+# is the same story
+DUP_THRESHOLD = 0.5
+# Newest articles compared per band bucket, bounds the work per article when
+# many articles share a band (boilerplate descriptions)
+MAX_BUCKET_CANDIDATES = 20
+# Rows kept per band key in article_band; a full bucket (boilerplate text)
+# stops growing so reading it stays cheap
+MAX_BUCKET_ROWS = 100
+# Band keys per IN (...) query
+QUERY_CHUNK = 900
+
+_PRIME = (1 << 32) + 15
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+def story_text(record: Dict) -> str:
+    return f"{record.get('title') or ''} {record.get('description') or ''}"
+
+
+def shingles(text: str) -> Set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        grams = words
+    else:
+        grams = (" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    hashed = shingles(text)
+    if not hashed:
+        return None
+    values = np.fromiter(hashed, dtype=np.uint64, count=len(hashed))[:, None]
+    return ((values * _A + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def signature_bytes(text: str) -> Optional[bytes]:
+    sig = signature(text)
+    return None if sig is None else sig.tobytes()
+
+
+def from_bytes(value: bytes) -> np.ndarray:
+    return np.frombuffer(value, dtype=np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[int]:
+    # One signed 64 bit key per band, the band number is part of the hash
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8,
+                                 person=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class StoryIndex:
+    """
+    In-memory LSH buckets: band key -> newest (article id, story id) pairs.
+    Assigning an article compares it with the articles sharing a band and
+    joins the story of the most similar one, or starts its own story.
+    """
+
+    def __init__(self, threshold: float = DUP_THRESHOLD, max_candidates: int = MAX_BUCKET_CANDIDATES):
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.buckets: Dict[int, List[Tuple[int, int]]] = {}
+        self.signatures: Dict[int, np.ndarray] = {}
+
+    def add(self, article_id: int, story_id: int, sig: np.ndarray, keys: Sequence[int]):
+        self.signatures[article_id] = sig
+        for key in keys:
+            bucket = self.buckets.setdefault(key, [])
+            bucket.append((article_id, story_id))
+            if len(bucket) > self.max_candidates:
+                del bucket[0]
+
+    def assign(self, article_id: int, sig: np.ndarray, keys: Optional[Sequence[int]] = None) -> int:
+        keys = band_keys(sig) if keys is None else keys
+        candidates = {}
+        for key in keys:
+            candidates.update(self.buckets.get(key, ()))
+        best_story, best_score = article_id, self.threshold
+        for candidate_id, story_id in candidates.items():
+            candidate_sig = self.signatures.get(candidate_id)
+            if candidate_sig is None:
+                continue
+            score = similarity(sig, candidate_sig)
+            if score >= best_score:
+                best_story, best_score = story_id, score
+        self.add(article_id, best_story, sig, keys)
+        return best_story
+
+
+def _chunks(values: List, size: int = QUERY_CHUNK) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def assign_stories(db, records: List[Dict], inserted: Dict[str, int]):
+    """
+    Tags the newly inserted articles with a story id, in the caller's
+    transaction. Only the band buckets of these articles are read from the
+    article_band table, so the cost per article does not grow with the corpus.
+    """
+    new, stories = [], []
+    seen = set()
+    for record in records:
+        article_id = inserted.get(record["uid"])
+        # A uid carried by several records (merged requests) was inserted once
+        if article_id is None or article_id in seen:
+            continue
+        seen.add(article_id)
+        if record.get("minhash"):
+            new.append((article_id, from_bytes(record["minhash"])))
+        else:
+            # Nothing to compare, the article is its own story
+            stories.append({"id": article_id, "story_id": article_id})
+    new.sort(key=lambda item: item[0])
+    keys = {article_id: band_keys(sig) for article_id, sig in new}
+
+    # Load the existing buckets of these keys and the candidates' signatures
+    index = StoryIndex()
+    all_keys = list({key for article_keys in keys.values() for key in article_keys})
+    rows = []
+    for chunk in _chunks(all_keys):
+        rows.extend(db.execute(
+            select(ArticleBand.key, ArticleBand.article_id, ArticleBand.story_id).where(ArticleBand.key.in_(chunk))
+        ))
+    rows.sort(key=lambda row: row[1])
+    full = set()
+    sizes: Dict[int, int] = {}
+    for key, article_id, story_id in rows:
+        sizes[key] = sizes.get(key, 0) + 1
+        if sizes[key] >= MAX_BUCKET_ROWS:
+            full.add(key)
+        bucket = index.buckets.setdefault(key, [])
+        bucket.append((article_id, story_id))
+        if len(bucket) > index.max_candidates:
+            del bucket[0]
+    candidate_ids = list({article_id for bucket in index.buckets.values() for article_id, _ in bucket})
+    for chunk in _chunks(candidate_ids):
+        for article_id, value in db.execute(select(Article.id, Article.minhash).where(Article.id.in_(chunk))):
+            if value:
+                index.signatures[article_id] = from_bytes(value)
+
+    bands = []
+    for article_id, sig in new:
+        story_id = index.assign(article_id, sig, keys[article_id])
+        stories.append({"id": article_id, "story_id": story_id})
+        bands.extend({"key": key, "article_id": article_id, "story_id": story_id}
+                     for key in keys[article_id] if key not in full)
+    if stories:
+        db.execute(update(Article), stories)
+    if bands:
+        db.execute(insert(ArticleBand), bands)
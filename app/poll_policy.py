@@ -0,0 +1,99 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+# Adaptive polling: feeds that keep returning nothing new are polled less
+# often, busy feeds more often, within bounds around the configured delay
+MIN_POLL_MINUTES = 5
+MAX_POLL_MINUTES = 24 * 60
+# How far the interval may move away from the configured delay
+MAX_SPEEDUP = 4
+MAX_BACKOFF = 8
+BACKOFF_FACTOR = 1.5
+SPEEDUP_FACTOR = 0.5
+# Feeds failing this many runs in a row are demoted: each further failure
+# doubles the interval, up to a week. The first successful run ends it.
+FAILURES_BEFORE_DEMOTION = 3
+DEMOTION_FACTOR = 2
+MAX_DEMOTED_MINUTES = 7 * 24 * 60
+# Statuses by which a publisher asks us to slow down, honoured whether or
+# not the interval adapts
+THROTTLE_STATUSES = frozenset({429, 503})
+# Random spread of each run, as a fraction of the interval
+JITTER_FRACTION = 0.1
+MAX_JITTER_SECONDS = 10 * 60
+
+
+def base_interval(delay_hours: int) -> float:
+    return delay_hours * 60.0
+
+
+def interval_bounds(delay_hours: int, ttl: Optional[int] = None) -> Tuple[float, float]:
+    base = base_interval(delay_hours)
+    low = max(base / MAX_SPEEDUP, MIN_POLL_MINUTES, ttl or 0)
+    high = max(base, min(base * MAX_BACKOFF, MAX_POLL_MINUTES))
+    return min(low, high), high
+
+
+def next_interval(current: float, delay_hours: int, new_items: int, news_count: int,
+                  ttl: Optional[int] = None, retry_after: Optional[float] = None) -> float:
+    """
+    Poll interval in minutes after a run that stored new_items new articles.
+    The publisher's <ttl> is a lower bound and a Retry-After wins over both.
+    """
+    if new_items == 0:
+        interval = current * BACKOFF_FACTOR
+    elif news_count and new_items >= news_count:
+        # Every item was new, we are likely missing some between polls
+        interval = current * SPEEDUP_FACTOR * SPEEDUP_FACTOR
+    else:
+        interval = current * SPEEDUP_FACTOR
+    low, high = interval_bounds(delay_hours, ttl)
+    interval = min(max(interval, low), high)
+    if retry_after:
+        interval = max(interval, retry_after)
+    return interval
+
+
+def demoted_interval(current: float, delay_hours: int, failures: int) -> Optional[float]:
+    """Poll interval in minutes after `failures` failed runs in a row, None if not demoted."""
+    if failures < FAILURES_BEFORE_DEMOTION:
+        return None
+    base = base_interval(delay_hours)
+    return min(max(current, base) * DEMOTION_FACTOR, max(MAX_DEMOTED_MINUTES, base))
+
+
+def throttled_interval(current: float, status_code: int, retry_after: Optional[float]) -> Optional[float]:
+    """Least poll interval in minutes the publisher asked for, None if it did not throttle us."""
+    if retry_after:
+        return min(retry_after, MAX_DEMOTED_MINUTES)
+    if status_code in THROTTLE_STATUSES:
+        return min(current * BACKOFF_FACTOR, MAX_POLL_MINUTES)
+    return None
+
+
+def retry_after_minutes(headers: Dict[str, str]) -> Optional[float]:
+    # Retry-After is either a number of seconds or an HTTP date
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value) / 60
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds() / 60, 0) or None
+
+
+def jitter_seconds(interval_minutes: float) -> int:
+    return int(min(interval_minutes * 60 * JITTER_FRACTION, MAX_JITTER_SECONDS))
+
+
+def first_run_offset(interval_minutes: float) -> float:
+    # Minutes until the first run, spread over the interval so feeds created
+    # together do not fire together
+    return interval_minutes * random.uniform(0.1, 1.0)
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import threading
+from typing import Dict, List, Sequence
+import spacy
+from sqlalchemy import update
+from models.article import Article
+
+# Only lemmas and the stop/punct flags are used, the parser and NER are not
+DISABLED_PIPES = ["parser", "ner"]
+BATCH_SIZE = 64
+# Worker processes for nlp.pipe, only worth their startup on large batches
+N_PROCESS = max(1, (os.cpu_count() or 1) // 2)
+MULTIPROCESS_MIN_TEXTS = 1000
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    # Loaded on first use, the model takes seconds and hundreds of MB
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                _nlp = spacy.load("en_core_web_sm", disable=DISABLED_PIPES)
+    return _nlp
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _tokens(doc) -> str:
+    return " ".join([token.lemma_ for token in doc if not token.is_stop and not token.is_punct])
+
+
+def preprocess_text(text: str) -> str:
+    return _tokens(get_nlp()(text.lower()))
+
+
+def preprocess_texts(texts: Sequence[str]) -> List[str]:
+    n_process = N_PROCESS if len(texts) >= MULTIPROCESS_MIN_TEXTS else 1
+    docs = get_nlp().pipe((text.lower() for text in texts), batch_size=BATCH_SIZE, n_process=n_process)
+    return [_tokens(doc) for doc in docs]
+
+
+def preprocess_articles(db, articles: Sequence[Article]) -> Dict[int, str]:
+    """
+    Returns {article id: processed text}. The processed text is cached on the
+    article with the hash of the content it came from, so each article is
+    lemmatized once unless its content changes.
+    """
+    processed = {}
+    pending = []
+    for article in articles:
+        digest = content_hash(article.content or "")
+        if article.processed_text is not None and article.processed_hash == digest:
+            processed[article.id] = article.processed_text
+        else:
+            pending.append((article, digest))
+
+    if pending:
+        texts = preprocess_texts([article.content or "" for article, _ in pending])
+        db.execute(
+            update(Article),
+            [
+                {"id": article.id, "processed_text": text, "processed_hash": digest}
+                for (article, digest), text in zip(pending, texts)
+            ],
+        )
+        db.commit()
+        for (article, _), text in zip(pending, texts):
+            processed[article.id] = text
+    return processed
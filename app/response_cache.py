@@ -0,0 +1,75 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+MAX_CACHED_RESPONSES = 256
+
+
+def body_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """
+    In-process read-through cache of encoded JSON responses. Keys carry the
+    version of their namespace, so a write only has to bump the version
+    (invalidate) and the stale entries age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes, Dict[str, str]]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def invalidate(self, namespace: str):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def get_or_build(self, namespace: str, params: tuple,
+                     build: Callable[[], Tuple[Any, Dict[str, str]]]) -> Tuple[str, bytes, Dict[str, str]]:
+        with self._lock:
+            key = (namespace, self.version(namespace)) + params
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+        data, headers = build()
+        body = json.dumps(jsonable_encoder(data), separators=(",", ":")).encode("utf-8")
+        etag = body_etag(body)
+        with self._lock:
+            # Do not store a result built while a write bumped the version
+            if key[1] == self.version(namespace):
+                self._entries[key] = (etag, body, headers)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body, headers
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_json_response(request: Request, cache: ResponseCache, namespace: str, params: tuple,
+                         build: Callable[[], Tuple[Any, Dict[str, str]]]) -> Response:
+    """Serves the cached body, or 304 when the client already has this ETag."""
+    etag, body, extra_headers = cache.get_or_build(namespace, params, build)
+    return etag_response(request, etag, body, extra_headers)
+
+
+def etag_response(request: Request, etag: str, body: bytes, extra_headers: Optional[Dict[str, str]] = None) -> Response:
+    # The encoded JSON body, or 304 when the client already has this ETag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(extra_headers or {})}
+    if etag in (request.headers.get("if-none-match") or "").replace(" ", "").split(","):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -1,26 +1,213 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+import os
+import socket
 from datetime import datetime, timedelta
-from utils import fetch_rss, clear_sched_feed
+from typing import Dict, List, Optional
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from database import engine, SessionLocal
+from config import MAX_FETCHES_IN_FLIGHT, ADAPTIVE_POLLING, FETCH_MODE
+from models.news_enrty import NewsEntry
+from models.job_lock import JobLock
+from utils import poll_feed, logger
+from schemas.news_response import NewsResponse
+from feed_parser import feed_ttl
+from poll_policy import (base_interval, next_interval, demoted_interval, throttled_interval, retry_after_minutes,
+                         jitter_seconds, first_run_offset)
+from work_queue import enqueue, dequeue, queued_ids, queue_rows
+
+# Jobs live in the database, so they survive restarts and every worker
+# process sees the same set
+scheduler = BackgroundScheduler(
+    jobstores={"default": SQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")},
+    executors={"default": ThreadPoolExecutor(MAX_FETCHES_IN_FLIGHT)},
+    # After downtime run a missed job once instead of once per missed interval
+    job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 15 * 60},
+)
+
+# Identifies this process in the job_lock table
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_id_for(news_id: int) -> str:
+    return f"feed_{news_id}"
+
+
+def acquire_job_lock(job_id: str, lease: timedelta) -> bool:
+    """
+    Leases the job's row in job_lock for this process. With several uvicorn
+    workers (or hosts) each scheduler fires the job, only the one that gets
+    the lease runs it.
+    """
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        claimed = db.execute(
+            update(JobLock)
+            .where(JobLock.job_id == job_id, or_(JobLock.locked_until == None, JobLock.locked_until < now))
+            .values(owner=OWNER, locked_until=now + lease)
+        ).rowcount
+        if not claimed:
+            db.add(JobLock(job_id=job_id, owner=OWNER, locked_until=now + lease))
+            try:
+                db.flush()
+                claimed = 1
+            except IntegrityError:
+                # The row exists and another process holds the lease
+                db.rollback()
+                return False
+        db.commit()
+        return bool(claimed)
+
+
+def load_task(news_id: int) -> Optional[NewsEntry]:
+    # The news entry, detached, or None when it is gone or no longer scheduled
+    with SessionLocal() as db:
+        task = db.get(NewsEntry, news_id)
+        if task is not None:
+            db.expunge(task)
+    if task is None or not task.auto_dialer or not task.scheduled:
+        logger.info(f"news entry {news_id} is gone or unscheduled, removing {job_id_for(news_id)}")
+        remove_task(news_id)
+        return None
+    return task
+
+
+def poll_task(task: NewsEntry) -> float:
+    # Fetches the feed, returns its poll interval in minutes from now on
+    result, response = poll_feed(task)
+    return adapt_interval(task, result, response)
+
 
-scheduler = BackgroundScheduler()
+def shorten_job_lock(job_id: str, until: datetime):
+    with SessionLocal() as db:
+        db.execute(
+            update(JobLock)
+            .where(JobLock.job_id == job_id, JobLock.owner == OWNER, JobLock.locked_until > until)
+            .values(locked_until=until)
+        )
+        db.commit()
+
+
+def run_feed_job(news_id: int):
+    job_id = job_id_for(news_id)
+    task = load_task(news_id)
+    if task is None:
+        return
+    # Hold the lease for half the current (adapted) interval, a second worker
+    # firing the same run is skipped while the next run is still allowed
+    interval = task.poll_interval or base_interval(task.delay)
+    started = datetime.utcnow()
+    if not acquire_job_lock(job_id, timedelta(minutes=interval) / 2):
+        logger.info(f"{job_id} is running in another process, skipping")
+        return
+    try:
+        interval = poll_task(task)
+    finally:
+        # The run may have shortened the interval, its lease must not skip the next run
+        shorten_job_lock(job_id, started + timedelta(minutes=interval) / 2)
+
+
+def adapt_interval(task: NewsEntry, result, response) -> float:
+    # The interval follows how often the feed has something new (with
+    # ADAPTIVE_POLLING), and grows further while the feed keeps failing or
+    # the publisher throttles us
+    succeeded = isinstance(response, NewsResponse)
+    failures = 0 if succeeded else (task.consecutive_failures or 0) + 1
+    new_items = response.new_articles if succeeded else 0
+    ttl = feed_ttl(result.content) if result.status_code == 200 else None
+    ttl = ttl or task.ttl
+    current = task.poll_interval or base_interval(task.delay)
+    retry_after = retry_after_minutes(result.headers)
+    if ADAPTIVE_POLLING:
+        interval = next_interval(current, task.delay, new_items, task.news_count,
+                                 ttl=ttl, retry_after=retry_after)
+    else:
+        interval = base_interval(task.delay)
+    throttled = throttled_interval(current, result.status_code, retry_after)
+    if throttled:
+        interval = max(interval, throttled)
+    demoted = demoted_interval(current, task.delay, failures)
+    if demoted:
+        interval = max(interval, demoted)
+    interval = max(int(round(interval)), 1)
+    if interval == current and ttl == task.ttl:
+        return interval
+    with SessionLocal() as db:
+        db.execute(update(NewsEntry).where(NewsEntry.id == task.id).values(poll_interval=interval, ttl=ttl))
+        db.commit()
+    if interval != current:
+        if demoted:
+            logger.warning(f"{job_id_for(task.id)}: {failures} failed runs in a row, "
+                           f"poll interval {current:.0f} -> {interval} min")
+        else:
+            logger.info(f"{job_id_for(task.id)}: {new_items} new items, poll interval {current:.0f} -> {interval} min")
+        # In queue mode the worker sets the next due time itself
+        if FETCH_MODE != "queue":
+            scheduler.reschedule_job(job_id_for(task.id), trigger=interval_trigger(interval))
+    return interval
+
+
+def interval_trigger(interval_minutes: float) -> IntervalTrigger:
+    return IntervalTrigger(minutes=interval_minutes, jitter=jitter_seconds(interval_minutes))
 
-# Dictionary to track tasks
-#dict of dict
-tasks = {}
 
 # Method to create a new scheduled task
-def create_task(task: str):
-    task_id = f"task_{len(tasks) + 1}"
-    next_run_time = datetime.now() + timedelta(hours=task.delay)
-
-    # Schedule the XML fetching job
-    job = scheduler.add_job(fetch_rss, 'interval', hours=task.delay, args=[task,task_id], id=task_id, next_run_time=next_run_time)
-    tasks[task_id] = {
-        'url': task.url,
-        'delay_hours': task.delay,
-        'news_count': task.news_count,
-        'next_run': next_run_time
-    }
+def create_task(task: NewsEntry, interval_minutes: float = None):
+    task_id = job_id_for(task.id)
+    interval = interval_minutes or base_interval(task.delay)
+    # The first run is spread over the interval, later runs are jittered
+    offset = timedelta(minutes=first_run_offset(interval))
+    if FETCH_MODE == "queue":
+        enqueue(task.id, datetime.utcnow() + offset)
+        return task_id
+    next_run_time = datetime.now() + offset
 
+    # Schedule the XML fetching job, the job id is stable per news entry
+    scheduler.add_job(run_feed_job, interval_trigger(interval), args=[task.id], id=task_id,
+                      next_run_time=next_run_time, replace_existing=True)
     return task_id
 
+
+def remove_task(news_id: int):
+    if FETCH_MODE == "queue":
+        dequeue(news_id)
+        return
+    job = scheduler.get_job(job_id_for(news_id))
+    if job is not None:
+        job.remove()
+
+
+def register_tasks():
+    # Re-create jobs (or queue rows) of scheduled entries missing from the
+    # job store
+    with SessionLocal() as db:
+        entries = db.query(NewsEntry).filter(NewsEntry.scheduled == True, NewsEntry.auto_dialer == True).all()
+    if FETCH_MODE == "queue":
+        queued = queued_ids()
+        missing = lambda entry: entry.id not in queued
+    else:
+        missing = lambda entry: scheduler.get_job(job_id_for(entry.id)) is None
+    registered = 0
+    for entry in entries:
+        if entry.delay and entry.delay > 0 and missing(entry):
+            create_task(entry, entry.poll_interval)
+            registered += 1
+    logger.info(f"re-registered {registered} of {len(entries)} scheduled feeds")
+
+
+def start_scheduling():
+    # In queue mode the worker processes run the feeds, not this scheduler
+    if FETCH_MODE != "queue":
+        scheduler.start()
+    register_tasks()
+
+
+def list_tasks() -> List[Dict]:
+    if FETCH_MODE == "queue":
+        return [{"task_id": job_id_for(row["news_id"]), "next_run_time": row["due_at"],
+                 "lease_owner": row["lease_owner"], "lease_until": row["lease_until"]} for row in queue_rows()]
+    return [{"task_id": job.id, "next_run_time": job.next_run_time, "interval": str(job.trigger.interval)}
+            for job in scheduler.get_jobs()]
@@ -6,4 +6,8 @@ class NewsResponse(BaseModel):
     name: str
     categories: List[str]
     tags: List[str]
-    news: List[Dict[str,Any]]
\ No newline at end of file
+    news: List[Dict[str,Any]]
+    # True when the feed was unchanged since the last fetch and was not parsed
+    not_modified: bool = False
+    # Items of this fetch that were not stored before
+    new_articles: int = 0
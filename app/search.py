@@ -0,0 +1,180 @@
+import base64
+import html
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+from database import engine
+from models.article import Article
+from models.news_enrty import NewsEntry
+from article_events import STREAM_FIELDS, list_contains
+
+# Full-text index of the stored articles in an SQLite FTS5 table. It is an
+# external content table over `article`: the text is not stored twice, and
+# triggers keep the index in step with every insert, update and delete in
+# the same transaction as the article rows.
+SEARCH_COLUMNS = ("title", "description", "content", "creator", "category")
+# BM25 weight of each column, a match in the title counts the most
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0, 2.0, 2.0)
+SNIPPET_TOKENS = 16
+MAX_SEARCH_LIMIT = 100
+
+article_fts = table("article_fts", column("rowid"), *(column(name) for name in SEARCH_COLUMNS))
+_fts = literal_column("article_fts")
+_TERM = re.compile(r'"[^"]*"?|\S+')
+# Snippet markers, replaced by <mark> once the snippet is escaped
+_OPEN, _CLOSE = "\x02", "\x03"
+# Messages of SQLite errors caused by the MATCH expression
+_QUERY_ERRORS = ("fts5", "unterminated string", "no such column", "unknown special query")
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def _ddl() -> List[str]:
+    columns = ", ".join(SEARCH_COLUMNS)
+    new = ", ".join(f"new.{name}" for name in SEARCH_COLUMNS)
+    old = ", ".join(f"old.{name}" for name in SEARCH_COLUMNS)
+    delete = f"INSERT INTO article_fts(article_fts, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO article_fts(rowid, {columns}) VALUES (new.id, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS article_fts_insert AFTER INSERT ON article BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS article_fts_delete AFTER DELETE ON article BEGIN {delete} END",
+        # Only edits of indexed columns touch the index, not story_id or processed_text
+        f"CREATE TRIGGER IF NOT EXISTS article_fts_update AFTER UPDATE OF {columns} ON article "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def create_search_index(bind) -> bool:
+    """
+    Creates the FTS5 table and its triggers when missing, and indexes the
+    articles stored before it existed. Returns False when the database is not
+    SQLite or SQLite was built without FTS5.
+    """
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.begin() as conn:
+        options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+        if "ENABLE_FTS5" not in options:
+            return False
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'article_fts'")
+        ).first()
+        if not exists:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE article_fts USING fts5({', '.join(SEARCH_COLUMNS)}, "
+                "content='article', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text("INSERT INTO article_fts(article_fts) VALUES ('rebuild')"))
+        for statement in _ddl():
+            conn.execute(text(statement))
+    return True
+
+
+def match_query(query: str) -> str:
+    # Plain input: every word must match, quoted text as a phrase and a
+    # trailing * as a prefix. Punctuation is quoted so it is not FTS5 syntax.
+    terms = []
+    for term in _TERM.findall(query):
+        prefix = term.endswith("*") and not term.startswith('"')
+        term = term.strip('"').rstrip("*").replace('"', '""')
+        if term.strip():
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    if not terms:
+        raise SearchQueryError("empty search query")
+    return " ".join(terms)
+
+
+def encode_cursor(score: float, article_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}:{article_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, article_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(score), int(article_id)
+    except ValueError:
+        raise SearchQueryError("invalid cursor")
+
+
+def _snippet(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return html.escape(value).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def search_articles(db, query: str, raw: bool = False, feed_id: Optional[int] = None, tag: Optional[str] = None,
+                    category: Optional[str] = None, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None, sort: str = "rank", cursor: Optional[str] = None,
+                    limit: int = 20) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Articles matching the query with a highlighted snippet of the best
+    matching column, best BM25 score first or, with sort="newest", latest
+    stored first. Returns the page and the cursor of the next page (None on
+    the last page). raw=True passes the query to FTS5 as is, with its
+    operators (OR, NOT, NEAR, column:term, ...).
+    """
+    if sort not in ("rank", "newest"):
+        raise SearchQueryError("sort must be rank or newest")
+    match = query if raw else match_query(query)
+    rowid = article_fts.c.rowid
+    score = func.bm25(_fts, *SEARCH_WEIGHTS)
+    # SQLite computes the snippets after the sort, only for the rows returned
+    snippet = func.snippet(_fts, -1, _OPEN, _CLOSE, "…", SNIPPET_TOKENS)
+    hits = select(rowid, score.label("score"), snippet.label("snippet")).where(_fts.op("MATCH")(match))
+    # The article table is only joined for the filters
+    if feed_id is not None or since is not None or until is not None or tag or category:
+        hits = hits.select_from(article_fts.join(Article.__table__, Article.id == rowid))
+    if feed_id is not None:
+        hits = hits.where(Article.news_entry_id == feed_id)
+    if since is not None:
+        hits = hits.where(Article.published_at >= since)
+    if until is not None:
+        hits = hits.where(Article.published_at < until)
+    if tag or category:
+        hits = hits.join(NewsEntry, NewsEntry.id == Article.news_entry_id)
+        if tag:
+            hits = hits.where(list_contains(NewsEntry.tags, tag))
+        if category:
+            hits = hits.where(list_contains(NewsEntry.categories, category))
+    # Keyset pagination, stable while articles are added. Ranking scores
+    # every match; newest reads the index in rowid order and stops early.
+    last_score, last_id = decode_cursor(cursor) if cursor else (None, None)
+    if sort == "rank":
+        if cursor:
+            hits = hits.where(or_(score > last_score, and_(score == last_score, rowid > last_id)))
+        hits = hits.order_by(score, rowid)
+    else:
+        if cursor:
+            hits = hits.where(rowid < last_id)
+        hits = hits.order_by(rowid.desc())
+
+    try:
+        page = db.execute(hits.limit(limit + 1)).all()
+    except OperationalError as e:
+        # FTS5 syntax errors of raw queries
+        if any(message in str(e.orig) for message in _QUERY_ERRORS):
+            raise SearchQueryError(str(e.orig))
+        raise
+    next_cursor = encode_cursor(page[limit - 1][1], page[limit - 1][0]) if len(page) > limit else None
+    page = page[:limit]
+    articles = {
+        article.id: article
+        for article in db.scalars(select(Article).where(Article.id.in_([hit[0] for hit in page])))
+    }
+
+    results = []
+    for article_id, article_score, article_snippet in page:
+        article = articles[article_id]
+        row = {field: getattr(article, field) for field in STREAM_FIELDS}
+        # bm25() is negative, lower is better
+        row["score"] = -article_score
+        row["snippet"] = _snippet(article_snippet)
+        results.append(row)
+    return results, next_cursor
+
+
+search_enabled = create_search_index(engine)
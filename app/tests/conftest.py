@@ -0,0 +1,18 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The app modules import each other by name and read their settings from the
+# environment when imported: point the database and logs at a scratch
+# directory before the tests load any of them
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix="newswire-tests-")
+atexit.register(shutil.rmtree, SCRATCH_DIR, True)
+
+sys.path.insert(0, APP_DIR)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "news.db")
+os.environ["PROFILE_DIR"] = os.path.join(SCRATCH_DIR, "profiles")
+os.environ["CORPUS_DIR"] = os.path.join(SCRATCH_DIR, "corpus")
+os.chdir(SCRATCH_DIR)
@@ -0,0 +1,65 @@
+from sqlalchemy import func, select
+from benchmarks.feeds import make_rss
+from database import SessionLocal
+from db_writer import ArticleWriter
+from feed_parser import iter_feed
+from models.article import Article, ArticleBand
+
+
+def feed_rows(prefix: str, items: int = 10, seed: int = 1):
+    return list(iter_feed(make_rss(items, 300, 0, seed=seed, prefix=prefix)))
+
+
+def stored(uids):
+    with SessionLocal() as db:
+        articles = db.scalar(select(func.count()).select_from(Article).where(Article.uid.in_(uids)))
+        ids = select(Article.id).where(Article.uid.in_(uids))
+        bands = db.scalar(select(func.count()).select_from(ArticleBand).where(ArticleBand.article_id.in_(ids)))
+    return articles, bands
+
+
+def test_overlapping_requests_store_each_article_once():
+    rows = feed_rows("overlap/")
+    # A long latency budget puts both requests in the same batch
+    writer = ArticleWriter(max_latency=0.5)
+    try:
+        first, second = writer.submit(1, rows), writer.submit(2, rows)
+        first, second = first.result(timeout=30), second.result(timeout=30)
+    finally:
+        writer.close()
+    # The new articles are reported to the request that carried them first
+    assert len(first) == len(rows)
+    assert second == {}
+    articles, bands = stored(list(first))
+    assert articles == len(rows)
+    with SessionLocal() as db:
+        per_article = db.scalar(select(func.count()).select_from(ArticleBand)
+                                .where(ArticleBand.article_id == next(iter(first.values()))))
+    assert bands == per_article * len(rows)
+
+
+def test_batched_requests_get_their_own_new_articles():
+    writer = ArticleWriter(max_latency=0.5)
+    feeds = {news_id: feed_rows(f"batch{news_id}/", items=5, seed=news_id) for news_id in range(1, 4)}
+    try:
+        futures = {news_id: writer.submit(news_id, rows) for news_id, rows in feeds.items()}
+        results = {news_id: future.result(timeout=30) for news_id, future in futures.items()}
+        # Stored articles are not new the second time
+        assert writer.store(1, feeds[1]) == {}
+    finally:
+        writer.close()
+    for news_id, new in results.items():
+        assert len(new) == len(feeds[news_id])
+        with SessionLocal() as db:
+            owners = set(db.scalars(select(Article.news_entry_id).where(Article.uid.in_(list(new)))))
+        assert owners == {news_id}
+
+
+def test_empty_request_and_restart_after_close():
+    writer = ArticleWriter(max_latency=0.01)
+    assert writer.submit(1, []).result(timeout=1) == {}
+    writer.store(1, feed_rows("restart-a/", items=2, seed=7))
+    writer.close()
+    # A request after close starts a new writer thread
+    assert len(writer.store(1, feed_rows("restart-b/", items=2, seed=8))) == 2
+    writer.close()
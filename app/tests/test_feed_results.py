@@ -0,0 +1,57 @@
+import threading
+import orjson
+import pytest
+from sqlalchemy import delete
+from database import SessionLocal
+from feed_results import delete_result, results_since, store_result
+from models.feed_result import FeedResult
+
+
+@pytest.fixture(autouse=True)
+def no_results():
+    with SessionLocal() as db:
+        db.execute(delete(FeedResult))
+        db.commit()
+
+
+def test_cursor_returns_latest_result_per_feed_in_seq_order():
+    _, cursor = results_since()
+    first = store_result(1, b'{"v":1}')
+    store_result(2, b'{"v":2}')
+    third = store_result(1, b'{"v":3}')
+    assert third > first
+    results, next_cursor = results_since(cursor)
+    # Feed 1 was stored again, only its latest result is left, after feed 2
+    assert results == [b'{"v":2}', b'{"v":3}']
+    assert next_cursor == third
+    assert results_since(next_cursor) == ([], next_cursor)
+    assert results_since(cursor, news_id=2)[0] == [b'{"v":2}']
+    delete_result(1)
+    assert results_since(cursor)[0] == [b'{"v":2}']
+
+
+def test_reader_following_the_cursor_misses_no_result():
+    # Writers in several threads, a reader polling meanwhile: once they are
+    # done the reader has seen the final result of every feed
+    _, cursor = results_since()
+    latest = {}
+
+    def write(worker):
+        for run in range(100):
+            news_id = worker * 100 + run % 10
+            store_result(news_id, orjson.dumps({"id": news_id, "run": run}))
+
+    def read(cursor):
+        results, cursor = results_since(cursor)
+        for body in results:
+            result = orjson.loads(body)
+            latest[result["id"]] = max(latest.get(result["id"], -1), result["run"])
+        return cursor
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        cursor = read(cursor)
+    cursor = read(cursor)
+    assert latest == {worker * 100 + n: 90 + n for worker in range(4) for n in range(10)}
@@ -0,0 +1,64 @@
+import threading
+import orjson
+from feed_results import results_since, store_result
+from feed_snapshots import FeedSnapshots, Snapshot
+from response_cache import body_etag
+from schemas.news_response import NewsResponse
+
+
+def response(title: str) -> NewsResponse:
+    return NewsResponse(name="feed", categories=[], tags=[], news=[{"title": title}])
+
+
+def titles(snapshot):
+    return [item["title"] for item in orjson.loads(snapshot.body)["news"]]
+
+
+def test_read_sees_the_result_another_process_stored_last():
+    # Two processes with their own memory copies, e.g. the API and a worker
+    api, worker = FeedSnapshots(), FeedSnapshots()
+    api.put(101, response("a"))
+    assert titles(api.get(101)) == ["a"]
+    worker.put(101, response("b"))
+    assert titles(api.get(101)) == ["b"]
+    assert api.get(101).etag == worker.get(101).etag
+
+
+def test_writer_that_stored_first_does_not_keep_its_result():
+    # Writer A stores its result, B stores a newer one before A has updated
+    # its memory copy: A must not serve its own result from then on
+    writer_a, writer_b = FeedSnapshots(), FeedSnapshots()
+    body = orjson.dumps(response("a").model_dump())
+    seq_a = store_result(102, body)
+    writer_b.put(102, response("b"))
+    writer_a._remember(102, Snapshot(body, body_etag(body), seq_a))
+    assert titles(writer_a.get(102)) == ["b"]
+
+
+def test_concurrent_puts_leave_the_last_stored_everywhere():
+    writers = [FeedSnapshots() for _ in range(4)]
+    _, cursor = results_since()
+
+    def put(writer, n):
+        for run in range(25):
+            writer.put(103, response(f"{n}-{run}"))
+
+    threads = [threading.Thread(target=put, args=(writer, n)) for n, writer in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results, _ = results_since(cursor, news_id=103)
+    # The cursor returns the last stored one, every writer serves it
+    assert all(writer.get(103).body == results[-1] for writer in writers)
+
+
+def test_delete_and_memory_budget():
+    snapshots = FeedSnapshots(max_bytes=200)
+    for news_id in range(110, 115):
+        snapshots.put(news_id, response("x" * 50))
+    # Evicted copies are read back from the database
+    assert titles(snapshots.get(110)) == ["x" * 50]
+    snapshots.delete(110)
+    assert snapshots.get(110) is None
+    assert FeedSnapshots().get(110) is None
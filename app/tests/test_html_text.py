@@ -0,0 +1,28 @@
+import pytest
+from benchmarks.bench_html_text import GOLDEN, fuzz_cases
+from benchmarks.feeds import make_rss
+from feed_parser import iter_feed
+from html_text import html_to_text, html_to_text_many, soup_to_text
+
+
+@pytest.mark.parametrize("raw, expected", GOLDEN)
+def test_golden(raw, expected):
+    # The expected text is what the BeautifulSoup cleaning always returned
+    assert soup_to_text(raw) == expected
+    assert html_to_text(raw) == expected
+
+
+def test_feed_items_match_soup():
+    rows = list(iter_feed(make_rss(20, 2000, 8000)))
+    texts = [row["description"] for row in rows] + [row["content"] for row in rows]
+    assert html_to_text_many(texts) == [soup_to_text(text) for text in texts]
+
+
+def test_fuzzed_markup_matches_soup():
+    for raw in fuzz_cases(2000):
+        assert html_to_text(raw) == soup_to_text(raw), raw
+
+
+def test_empty():
+    assert html_to_text("") == ""
+    assert html_to_text(None) == ""
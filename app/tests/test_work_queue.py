@@ -0,0 +1,85 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete
+from database import SessionLocal
+from models.feed_queue import FeedQueueItem
+from work_queue import claim_due, complete, enqueue, heartbeat, queue_rows, release
+
+LEASE = timedelta(seconds=60)
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    with SessionLocal() as db:
+        db.execute(delete(FeedQueueItem))
+        db.commit()
+
+
+def test_claims_due_feeds_longest_overdue_first():
+    now = datetime.utcnow()
+    enqueue(1, now - timedelta(minutes=1))
+    enqueue(2, now - timedelta(minutes=5))
+    enqueue(3, now - timedelta(minutes=3))
+    enqueue(4, now + timedelta(minutes=5))
+    assert sorted(claim_due("a", 2, LEASE, now)) == [2, 3]
+    assert claim_due("a", 10, LEASE, now) == [1]
+    # Leased feeds are not handed out again, the one not due yet neither
+    assert claim_due("b", 10, LEASE, now) == []
+
+
+def test_concurrent_workers_never_claim_the_same_feed():
+    now = datetime.utcnow()
+    for news_id in range(1, 201):
+        enqueue(news_id, now - timedelta(seconds=news_id))
+    claims = []
+
+    def work(owner):
+        while True:
+            claimed = claim_due(owner, 7, LEASE, now)
+            if not claimed:
+                return
+            claims.extend(claimed)
+
+    threads = [threading.Thread(target=work, args=(f"w{n}",)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claims) == list(range(1, 201))
+
+
+def test_expired_lease_is_taken_over():
+    now = datetime.utcnow() - timedelta(minutes=10)
+    enqueue(1, now)
+    assert claim_due("a", 1, LEASE, now) == [1]
+    assert claim_due("b", 1, LEASE, now + LEASE - timedelta(seconds=1)) == []
+    assert claim_due("b", 1, LEASE, now + LEASE + timedelta(seconds=1)) == [1]
+    # The worker that lost the lease can neither extend nor complete it
+    assert heartbeat("a", [1], LEASE) == 0
+    assert not complete(1, "a", now, now + timedelta(hours=1))
+    assert queue_rows()[0]["lease_owner"] == "b"
+
+
+def test_complete_sets_next_run_unless_enqueued_meanwhile():
+    now = datetime.utcnow()
+    enqueue(1, now)
+    enqueue(2, now)
+    claim_due("a", 2, LEASE, now)
+    # Feed 2 was rescheduled by the API while its fetch ran
+    moved = now + timedelta(minutes=3)
+    enqueue(2, moved)
+    next_run = now + timedelta(hours=1)
+    assert complete(1, "a", now, next_run)
+    assert complete(2, "a", now, next_run)
+    rows = {row["news_id"]: row for row in queue_rows()}
+    assert rows[1]["due_at"] == next_run and rows[1]["lease_owner"] is None
+    assert rows[2]["due_at"] == moved
+
+
+def test_release_keeps_due_time():
+    now = datetime.utcnow()
+    enqueue(1, now)
+    claim_due("a", 1, LEASE, now)
+    release("a", [1])
+    assert claim_due("b", 1, LEASE, now) == [1]
@@ -1,155 +1,240 @@
-import requests
 import xmltodict
-import json
 from datetime import datetime
-from bs4 import BeautifulSoup
-import lxml
 import logging
+import atexit
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import Request
 from functools import wraps
 import os
-import csv
 import asyncio
-import html
+from typing import Dict, List
+import orjson
+from fetcher import fetcher, FetchResult
+from feed_parser import iter_feed
+from html_text import html_to_text, html_to_text_many
+from db_writer import save_articles
+from feed_buffer import FeedResultBuffer
+from feed_snapshots import feed_snapshots
+from article_events import article_events
+from feed_metrics import FeedRunStats, record_feed_run, profiled, profile_requested
+from feed_cache import conditional_headers, check_unchanged, store_validators
 from schemas.news_response import NewsResponse
 from schemas.news_request import NewsEntrySchema
-#global variable for storing schedular data
-SCHED_FEED = []
+from config import LOG_LEVEL, LOG_BODY_SAMPLE_RATE, LOG_BODY_MAX_CHARS, CLEAN_HTML_CONTENT, FETCH_MODE
+# Item fields whose markup is stripped before storing
+CLEANED_FIELDS = ("description", "content") if CLEAN_HTML_CONTENT else ("description",)
+
+#global buffer for storing schedular data, bounded per feed and in bytes. It
+# holds the encoded snapshots, /job-result sends them without encoding again
+SCHED_FEED = FeedResultBuffer()
 
 # Ensure `logs` directory exists
 if not os.path.exists("logs"):
     os.makedirs("logs")
 
-# Setup basic logging configuration
+# Setup logging: records go through a queue and a listener thread does the
+# file and console I/O, so request threads never wait on it
 log_file_path = "logs/app.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file_path),
-        logging.StreamHandler()  # Optional: to also log to console
-    ]
-)
+log_queue = queue.Queue(-1)
+log_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+file_handler = logging.FileHandler(log_file_path)
+file_handler.setFormatter(log_formatter)
+console_handler = logging.StreamHandler()  # Optional: to also log to console
+console_handler.setFormatter(log_formatter)
+log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))  # the listener's handlers do the formatting
+logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler])
 logger = logging.getLogger(__name__)
 
+
+def truncate(value, limit: int = LOG_BODY_MAX_CHARS) -> str:
+    text = repr(value)
+    if len(text) > limit:
+        return f"{text[:limit]}... ({len(text)} chars)"
+    return text
+
+
 # Custom decorator to log request and response
+# Arguments are logged truncated, response bodies only for a sample of calls.
+# Latency, status and sizes of every request are recorded by MetricsMiddleware.
 def log_request_response(func):
-    @wraps(func)
-    async def wrapper(*args, **kwargs):
-        # # Extract request object from FastAPI's args
-        # request: Request = kwargs.get('Request')
-        logger.info(f"Request:{kwargs}")  # Log the request
-        # body = request.json()  # Log the request body if it exists
-        # logger.info(f"Request: {request.method} {request.url}, Body: {body}")
-
-        try:
-            # Call the route function
-            if asyncio.iscoroutinefunction(func):
-                response = await func(*args, **kwargs)  # For async functions
-            else:
-                response = func(*args, **kwargs)  # For sync functions
-            
-            # Log the response data
-            logger.info(f"Response: {response}")
+    def log_request(kwargs):
+        logger.info(f"Request: {func.__name__} {truncate({k: v for k, v in kwargs.items() if k not in ('db', 'request')})}")
+
+    def log_response(response):
+        if random.random() < LOG_BODY_SAMPLE_RATE:
+            logger.info(f"Response: {func.__name__} {truncate(response)}")
+
+    # Keep sync routes sync, FastAPI runs them in its thread pool
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            log_request(kwargs)
+            try:
+                response = await func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Exception occurred in {func.__name__}: {e}")
+                raise
+            log_response(response)
+            return response
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            log_request(kwargs)
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Exception occurred in {func.__name__}: {e}")
+                raise
+            log_response(response)
             return response
-        except Exception as e:
-            logger.error(f"Exception occurred: {e}")
-            raise e
 
     return wrapper
 
-# Fetch XML, convert to JSON, and save to file
-def fetch_rss(news_entry: NewsEntrySchema, task_id = 0):
-    global SCHED_FEED
+# Categories and tags are stored comma separated, and may be empty
+def split_list(value) -> List[str]:
+    return value.split(",") if value else []
+
+# Items of the feed's latest snapshot, empty when it has none
+def stored_items(news_id: int) -> List[Dict]:
+    snapshot = feed_snapshots.get(news_id)
+    return orjson.loads(snapshot.body)["news"] if snapshot is not None else []
+
+# Parse the downloaded feed, save the items and keep the result. Every run is
+# timed per stage, and profiled when asked for through `profile` or
+# request_profile(news_id). The run and its outcome are recorded even when
+# processing fails; the error is raised again for the caller
+def process_feed(news_entry: NewsEntrySchema, result: FetchResult, task_id = 0, profile = False, scheduled = False):
+    stats = FeedRunStats(result)
+    profile_output = {"path": None}
+    try:
+        with profiled(f"feed_{news_entry.id}", profile or profile_requested(news_entry.id)) as profile_output:
+            return _process_feed(news_entry, result, stats, task_id, scheduled)
+    except Exception as e:
+        stats.error = f"{type(e).__name__}: {e}"
+        logger.exception(f"could not process the feed {news_entry.url}")
+        raise
+    finally:
+        record_feed_run(news_entry.id, stats, profile_output["path"])
+
+# For batch fetches: a feed that fails to process does not fail the others,
+# its exception is returned in place of the response
+def try_process_feed(news_entry: NewsEntrySchema, result: FetchResult, scheduled = False):
     try:
-        logger.info(f"news_entry.url-->{news_entry.url}")
-        data = requests.get(news_entry.url)
-
-        if data.status_code == 200:
-            newsSoup = BeautifulSoup(data.content,'xml')
-            entries = newsSoup.find_all('item')
-            entries = entries[:news_entry.news_count]
-            # List to hold all news items
-            news_items = []
-            
-            # CSV file path
-            csv_file = 'news_data.csv'
-            fieldnames = ["title", "link", "published_date", "creator", "category", "content", "description", "guid", "media"]
-
-            # Check if file exists to decide whether to write header
-            file_exists = os.path.isfile(csv_file)
-
-            with open(csv_file, mode='a', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-
-                if not file_exists:
-                    writer.writeheader()  # Write header only once if file is new
-
-                for entry in entries:
-                    logger.info(f"entry-->> {entry}")
-
-                    title = entry.title.text
-                    pub_date = entry.pubDate.text
-                    guid = entry.guid.text
-                    link = entry.link.text
-                    
-                    raw_content = entry.find('content:encoded').text if entry.find('content:encoded') else ""
-                    # content = clean_html_text(raw_content)
-                    content = raw_content
-                    raw_description = entry.description.text if entry.description else ""
-                    description = clean_html_text(raw_description)
-
-                    creator = entry.find('dc:creator').text if entry.find('dc:creator') else "No creator"
-                    category = entry.category.text if entry.find('category') else "No category"
-
-                    if entry.find('media:thumbnail'):
-                        media = entry.find('media:thumbnail')['url']
-                    elif entry.find('enclosure'):
-                        media = entry.find('enclosure')['url']
-                    else:
-                        media = "No thumbnail"
-
-                    row = {
-                        "title": title,
-                        "link": link,
-                        "published_date": pub_date,
-                        "creator": creator,
-                        "category": category,
-                        "content": content,
-                        "description": description,
-                        "guid": guid,
-                        "media": media
-                    }
-                    news_items.append(row)
-                    writer.writerow(row)
-
-            fetched_data = NewsResponse(name=news_entry.name, categories=news_entry.categories.split(","), tags=news_entry.tags.split(","), news=news_items)
-            logger.info(f"fetched_data::::{fetched_data}")
-            # NewsResponse(name=news_entry.name, catagories=news_entry.categories, tags=news_entry.tags, news=news_items)
-            
-            SCHED_FEED.append(fetched_data)
-            logger.info("array--->>>>>>",len(SCHED_FEED))
+        return process_feed(news_entry, result, scheduled=scheduled)
+    except Exception as e:
+        return e
+
+def _process_feed(news_entry: NewsEntrySchema, result: FetchResult, stats: FeedRunStats, task_id = 0, scheduled = False):
+    global SCHED_FEED
+    if result.status_code in (200, 304):
+        # Skip parsing when the publisher has not changed the feed
+        unchanged, digest = check_unchanged(news_entry.id, result)
+        if unchanged:
+            logger.info(f"feed not modified: {news_entry.url}")
+            store_validators(news_entry.id, result, digest)
             if not task_id:
-                return fetched_data            # Return the list of news items as a JSON object
-        else:
-            logger.info(f"status code: {data.status_code} id returned by thr rss feed")
-    except:
-        # Return error message if request failed
-        # return json.dumps({"error": "Failed to fetch RSS feed", "status_code": data.status_code}, indent=4) 
-        return json.dumps({"error": "Failed to fetch RSS feed", "status_code":400}, indent=4)    
+                # A scheduled poll only needs to know that nothing changed, API
+                # callers get the items of the last parse
+                news = [] if scheduled else stored_items(news_entry.id)
+                return NewsResponse(name=news_entry.name, categories=split_list(news_entry.categories), tags=split_list(news_entry.tags), news=news, not_modified=True)
+            return
+
+    if result.status_code == 200:
+        # List to hold all news items
+        news_items = []
+        
+        # Stream the items, parsing stops after news_count of them
+        with stats.stage("parse"):
+            news_items.extend(iter_feed(result.content, news_entry.news_count))
+        stats.items = len(news_items)
+
+        # Then strip the markup of the whole batch
+        with stats.stage("clean"):
+            for field in CLEANED_FIELDS:
+                for row, text in zip(news_items, html_to_text_many(row[field] for row in news_items)):
+                    row[field] = text
+
+        # Articles already stored by an earlier poll are skipped
+        with stats.stage("store"):
+            new_articles = save_articles(news_entry.id, news_items)
+        stats.new_items = len(new_articles)
+        if new_articles:
+            article_events.publish()
+        logger.info(f"{len(new_articles)} new articles from {news_entry.url}")
+
+        fetched_data = NewsResponse(name=news_entry.name, categories=split_list(news_entry.categories), tags=split_list(news_entry.tags), news=news_items, new_articles=len(new_articles))
+        logger.info(f"fetched {len(news_items)} items from {news_entry.url}")
+        # NewsResponse(name=news_entry.name, catagories=news_entry.categories, tags=news_entry.tags, news=news_items)
+        
+        store_validators(news_entry.id, result, digest)
+        snapshot = feed_snapshots.put(news_entry.id, fetched_data)
+        # In queue mode the API reads the results of the workers from the database
+        if FETCH_MODE != "queue":
+            SCHED_FEED.append(news_entry.id, snapshot, size=len(snapshot.body))
+            logger.info(f"array--->>>>>> {len(SCHED_FEED)}")
+        if not task_id:
+            return fetched_data            # Return the list of news items as a JSON object
+    else:
+        logger.info(f"status code: {result.status_code} {result.error or ''} returned by the rss feed {news_entry.url}")
+
+# Blocking fetch and process, returns the raw fetch result too so the
+# scheduler can read the response headers. A processing error is returned
+# as the response
+def poll_feed(news_entry: NewsEntrySchema):
+    logger.info(f"news_entry.url-->{news_entry.url}")
+    result = fetcher.fetch(news_entry.url, conditional_headers(news_entry.id))
+    return result, try_process_feed(news_entry, result, scheduled=True)
+
+# Fetch XML, convert to JSON, and save to file
+# Blocking version, used by the scheduler threads
+def fetch_rss(news_entry: NewsEntrySchema, task_id = 0):
+    _, response = poll_feed(news_entry)
+    if isinstance(response, Exception):
+        raise response
+    if not task_id:
+        return response
+
+# Awaitable version, used by the async API routes
+async def fetch_rss_async(news_entry: NewsEntrySchema, profile: bool = False):
+    logger.info(f"news_entry.url-->{news_entry.url}")
+    headers = await asyncio.to_thread(conditional_headers, news_entry.id)
+    result = await fetcher.fetch_async(news_entry.url, headers)
+    # Parsing is CPU bound, keep it off the event loop
+    return await asyncio.to_thread(process_feed, news_entry, result, 0, profile)
+
+# Fetch the given entries concurrently through the shared fetcher
+def fetch_rss_many(news_entries: List[NewsEntrySchema]):
+    results = fetcher.fetch_many((entry.url, conditional_headers(entry.id)) for entry in news_entries)
+    return [try_process_feed(entry, result) for entry, result in zip(news_entries, results)]
+
+async def fetch_rss_many_async(news_entries: List[NewsEntrySchema]):
+    headers = await asyncio.to_thread(lambda: [conditional_headers(entry.id) for entry in news_entries])
+    results = await fetcher.fetch_many_async(zip((entry.url for entry in news_entries), headers))
+    return await asyncio.gather(*(asyncio.to_thread(try_process_feed, entry, result)
+                                  for entry, result in zip(news_entries, results)))
+
+# Fetch the given entries concurrently, yielding (entry, fetch result,
+# response) in completion order
+async def fetch_rss_as_completed(news_entries: List[NewsEntrySchema]):
+    async def fetch_one(entry):
+        headers = await asyncio.to_thread(conditional_headers, entry.id)
+        result = await fetcher.fetch_async(entry.url, headers)
+        return entry, result, await asyncio.to_thread(try_process_feed, entry, result)
+
+    for next_done in asyncio.as_completed([fetch_one(entry) for entry in news_entries]):
+        yield await next_done
 
 def clean_html_text(raw_html: str) -> str:
     """
     Removes HTML tags, decodes HTML entities, and strips whitespace/newlines.
     """
-    if not raw_html:
-        return ""
-
-    # Remove HTML tags
-    soup = BeautifulSoup(raw_html, "html.parser")
-    plain_text = soup.get_text(separator=' ')  # ensures text separated by space
-    decoded = html.unescape(plain_text)        # decode HTML entities like &amp;, &#8217;, etc.
-    return decoded.replace('\n', ' ').replace('\r', '').strip()
+    return html_to_text(raw_html)
 
 def clear_sched_feed():
     global SCHED_FEED
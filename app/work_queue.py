@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import case, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models.feed_queue import FeedQueueItem
+
+# The feed_queue table of FETCH_MODE=queue: the API enqueues the scheduled
+# feeds with the time of their next run, worker processes claim the due ones
+# under a lease, and put them back with their next due time once fetched.
+# Times are naive UTC, like the job_lock leases.
+
+
+def _free(now: datetime):
+    # Not leased, or the lease of a crashed or stalled worker expired
+    return or_(FeedQueueItem.lease_until == None, FeedQueueItem.lease_until < now)
+
+
+def enqueue(news_id: int, due_at: datetime):
+    # Adds the feed or moves its next run; the lease of a running fetch is kept
+    with SessionLocal() as db:
+        updated = db.execute(
+            update(FeedQueueItem).where(FeedQueueItem.news_entry_id == news_id).values(due_at=due_at)
+        ).rowcount
+        if not updated:
+            db.add(FeedQueueItem(news_entry_id=news_id, due_at=due_at))
+            try:
+                db.flush()
+            except IntegrityError:
+                # Enqueued by another process in the meantime
+                db.rollback()
+                db.execute(update(FeedQueueItem).where(FeedQueueItem.news_entry_id == news_id)
+                           .values(due_at=due_at))
+        db.commit()
+
+
+def dequeue(news_id: int):
+    with SessionLocal() as db:
+        db.execute(delete(FeedQueueItem).where(FeedQueueItem.news_entry_id == news_id))
+        db.commit()
+
+
+def queued_ids() -> set:
+    with SessionLocal() as db:
+        return set(db.scalars(select(FeedQueueItem.news_entry_id)))
+
+
+def claim_due(owner: str, limit: int, lease: timedelta, now: Optional[datetime] = None) -> List[int]:
+    """
+    Leases up to limit feeds due at now to owner, the longest overdue first,
+    and returns their ids. Workers claiming at the same time never get the
+    same feed: on Postgres the candidate rows are locked with SKIP LOCKED,
+    and the update re-checks that each row is still free.
+    """
+    now = now or datetime.utcnow()
+    due = (
+        select(FeedQueueItem.news_entry_id)
+        .where(FeedQueueItem.due_at <= now, _free(now))
+        .order_by(FeedQueueItem.due_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    with SessionLocal() as db:
+        claimed = db.execute(
+            update(FeedQueueItem)
+            .where(FeedQueueItem.news_entry_id.in_(due), _free(now))
+            .values(lease_owner=owner, lease_until=now + lease, heartbeat_at=now)
+            .returning(FeedQueueItem.news_entry_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.commit()
+    return list(claimed)
+
+
+def heartbeat(owner: str, news_ids: Iterable[int], lease: timedelta) -> int:
+    # Extends the leases owner still holds, returns how many it does
+    news_ids = list(news_ids)
+    if not news_ids:
+        return 0
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        extended = db.execute(
+            update(FeedQueueItem)
+            .where(FeedQueueItem.news_entry_id.in_(news_ids), FeedQueueItem.lease_owner == owner)
+            .values(lease_until=now + lease, heartbeat_at=now)
+        ).rowcount
+        db.commit()
+    return extended
+
+
+def complete(news_id: int, owner: str, claimed_at: datetime, due_at: datetime) -> bool:
+    # Releases the lease and sets the next run, unless the feed was enqueued
+    # again while it ran. False when the lease was lost to another worker,
+    # whose run then decides the next due time
+    with SessionLocal() as db:
+        done = db.execute(
+            update(FeedQueueItem)
+            .where(FeedQueueItem.news_entry_id == news_id, FeedQueueItem.lease_owner == owner)
+            .values(due_at=case((FeedQueueItem.due_at > claimed_at, FeedQueueItem.due_at), else_=due_at),
+                    lease_owner=None, lease_until=None, last_finished_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+    return bool(done)
+
+
+def release(owner: str, news_ids: Iterable[int]):
+    # Gives unfinished feeds back without moving their due time
+    news_ids = list(news_ids)
+    if not news_ids:
+        return
+    with SessionLocal() as db:
+        db.execute(
+            update(FeedQueueItem)
+            .where(FeedQueueItem.news_entry_id.in_(news_ids), FeedQueueItem.lease_owner == owner)
+            .values(lease_owner=None, lease_until=None)
+        )
+        db.commit()
+
+
+def next_due_at() -> Optional[datetime]:
+    # When the earliest unleased feed is due
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        return db.scalar(select(func.min(FeedQueueItem.due_at)).where(_free(now)))
+
+
+def queue_rows() -> List[Dict]:
+    with SessionLocal() as db:
+        rows = db.scalars(select(FeedQueueItem).order_by(FeedQueueItem.due_at)).all()
+    return [
+        {
+            "news_id": row.news_entry_id,
+            "due_at": row.due_at,
+            "lease_owner": row.lease_owner,
+            "lease_until": row.lease_until,
+            "heartbeat_at": row.heartbeat_at,
+            "last_finished_at": row.last_finished_at,
+        }
+        for row in rows
+    ]
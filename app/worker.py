@@ -0,0 +1,141 @@
+"""
+Fetch worker of FETCH_MODE=queue: claims the due feeds from the feed_queue
+table under a lease, fetches them like the scheduler would and queues their
+next run. Any number of workers, in one host or many sharing the database
+(Postgres for more than one host), poll in parallel without fetching a feed
+twice. The API process is started with FETCH_MODE=queue too, so it only
+enqueues the scheduled feeds. Run from the app directory:
+
+    FETCH_MODE=queue python -m worker [--concurrency 20] [--lease-seconds 120]
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from config import FETCH_MODE, WORKER_CONCURRENCY, WORKER_LEASE_SECONDS, WORKER_POLL_SECONDS
+from scheduler import load_task, poll_task
+from fetcher import fetcher
+from db_writer import article_writer
+from poll_policy import base_interval, jitter_seconds
+from utils import logger
+from work_queue import claim_due, complete, heartbeat, next_due_at, release
+
+
+class FeedWorker:
+    """
+    Claims due feeds while it has free threads and runs them. A heartbeat
+    thread extends the leases of the running fetches every third of the
+    lease, so only the feeds of a crashed or hung worker expire and are
+    claimed by the others.
+    """
+
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, lease_seconds: int = WORKER_LEASE_SECONDS,
+                 poll_seconds: float = WORKER_POLL_SECONDS, owner: Optional[str] = None):
+        self.concurrency = concurrency
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix="feed-worker")
+        self.running: Dict[int, Future] = {}
+        self.stopping = threading.Event()
+        self.runs = 0
+
+    def stop(self, *args):
+        if not self.stopping.is_set():
+            logger.info(f"worker {self.owner}: stopping after {len(self.running)} running fetches")
+        self.stopping.set()
+
+    def run(self):
+        logger.info(f"worker {self.owner}: started with {self.concurrency} threads")
+        beat = threading.Thread(target=self._heartbeat, name="feed-worker-heartbeat", daemon=True)
+        beat.start()
+        try:
+            while not self.stopping.is_set():
+                self._reap()
+                free = self.concurrency - len(self.running)
+                now = datetime.utcnow()
+                claimed = claim_due(self.owner, free, self.lease, now) if free else []
+                for news_id in claimed:
+                    self.running[news_id] = self.executor.submit(self._run_feed, news_id, now)
+                if free and len(claimed) == free:
+                    # More may be due, claim again once a thread frees up
+                    continue
+                if self.running and not free:
+                    wait(list(self.running.values()), timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                else:
+                    self.stopping.wait(self._idle_seconds())
+        finally:
+            # Let the running fetches finish, hand back anything left over
+            self.executor.shutdown(wait=True)
+            self.stopping.set()
+            beat.join()
+            release(self.owner, list(self.running))
+            logger.info(f"worker {self.owner}: stopped after {self.runs} runs")
+
+    def _idle_seconds(self) -> float:
+        due_at = next_due_at()
+        if due_at is None:
+            return self.poll_seconds
+        return min(max((due_at - datetime.utcnow()).total_seconds(), 0.05), self.poll_seconds)
+
+    def _reap(self):
+        for news_id, future in list(self.running.items()):
+            if future.done():
+                del self.running[news_id]
+                self.runs += 1
+
+    def _heartbeat(self):
+        while not self.stopping.wait(self.lease.total_seconds() / 3):
+            try:
+                running = [news_id for news_id, future in list(self.running.items()) if not future.done()]
+                held = heartbeat(self.owner, running, self.lease)
+                if held < len(running):
+                    logger.warning(f"worker {self.owner}: lost the lease of {len(running) - held} feeds")
+            except Exception:
+                logger.exception(f"worker {self.owner}: heartbeat failed")
+
+    def _run_feed(self, news_id: int, claimed_at: datetime):
+        task = load_task(news_id)
+        if task is None:
+            # load_task took it off the queue
+            return
+        interval = None
+        try:
+            interval = poll_task(task)
+        except Exception:
+            # The failed run is recorded by process_feed, retry after the interval
+            logger.exception(f"worker {self.owner}: feed {news_id} failed")
+        interval = interval or task.poll_interval or base_interval(task.delay)
+        due_at = datetime.utcnow() + timedelta(minutes=interval, seconds=random.uniform(0, jitter_seconds(interval)))
+        if not complete(news_id, self.owner, claimed_at, due_at):
+            logger.warning(f"worker {self.owner}: feed {news_id} finished after its lease was taken over")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="fetches at the same time")
+    parser.add_argument("--lease-seconds", type=int, default=WORKER_LEASE_SECONDS)
+    parser.add_argument("--poll-seconds", type=float, default=WORKER_POLL_SECONDS,
+                        help="longest wait for due feeds")
+    args = parser.parse_args()
+    if FETCH_MODE != "queue":
+        # The API then runs the feeds itself and enqueues none
+        parser.error("set FETCH_MODE=queue for the workers and the API")
+
+    worker = FeedWorker(args.concurrency, args.lease_seconds, args.poll_seconds)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run()
+    finally:
+        fetcher.close()
+        article_writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from sqlalchemy import create_engine, Column, Integer, String, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from fastapi.middleware.cors import CORSMiddleware
+from app.response_cache import ResponseCache, cached_json_response
 
 
 # Database setup
@@ -58,6 +59,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
@@ -87,13 +89,30 @@ def create_news_entry(news_entry: NewsEntrySchema, db: SessionLocal = Depends(ge
     db.add(entry)
     db.commit()
     db.refresh(entry)
+    entries_cache.invalidate("entries")
     
     return {"message": "News entry created", "data": entry}
 
-# GET endpoint to retrieve all news entries
+# Encoded /news_entries/ pages, keyed by (limit, after_id); a write
+# invalidates the "entries" namespace
+entries_cache = ResponseCache()
+MAX_PAGE_SIZE = 500
+
+# GET endpoint to retrieve the news entries, one page at a time
+# Pass the X-Next-Cursor response header back as after_id to get the next page
 @app.get("/news_entries/")
-def get_news_entries(db: SessionLocal = Depends(get_db)):
-    entries = db.query(NewsEntry).all()
+def get_news_entries(request: Request, limit: int = 100, after_id: int = 0):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    def build():
+        with SessionLocal() as db:
+            entries = db.query(NewsEntry).filter(NewsEntry.id > after_id).order_by(NewsEntry.id).limit(limit).all()
+            next_cursor = str(entries[-1].id) if len(entries) == limit else ""
+            return serialize_entries(entries), {"X-Next-Cursor": next_cursor}
+
+    return cached_json_response(request, entries_cache, "entries", (limit, after_id), build)
+
+def serialize_entries(entries):
     return [
         {
             "id": entry.id,